@@ -7,9 +7,11 @@ Web服务调试脚本
 """
 
 import os
+import re
 import sys
 import logging
 import traceback
+from importlib.metadata import version, PackageNotFoundError
 
 # 设置日志级别为DEBUG，以便查看详细信息
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -21,6 +23,10 @@ src_path = os.path.join(project_root, 'src')
 sys.path.insert(0, project_root)
 sys.path.insert(0, src_path)
 
+# main.py 中端口和主机配置的匹配模式
+_PORT_RE = re.compile(r'port\s*=\s*(\d+)')
+_HOST_RE = re.compile(r'host\s*=\s*(["\'])(.*?)\1')
+
 
 def test_web_service_init():
     """测试Web服务初始化"""
@@ -97,12 +103,19 @@ def check_port_config():
     main_file_path = os.path.join(src_path, 'core', 'main.py')
     
     try:
+        # 逐行查找端口和主机配置，两者都找到后立即停止读取
+        port_match = None
+        host_match = None
         with open(main_file_path, 'r') as f:
-            content = f.read()
-            
+            for line in f:
+                if port_match is None:
+                    port_match = _PORT_RE.search(line)
+                if host_match is None:
+                    host_match = _HOST_RE.search(line)
+                if port_match and host_match:
+                    break
+        
         # 查找端口配置
-        import re
-        port_match = re.search(r'port\s*=\s*(\d+)', content)
         if port_match:
             port = port_match.group(1)
             logger.info(f"✓ 在 main.py 中找到端口配置: {port}")
@@ -110,7 +123,6 @@ def check_port_config():
             logger.warning(f"⚠ 在 main.py 中未找到明确的端口配置")
         
         # 查找主机配置
-        host_match = re.search(r'host\s*=\s*(["\'])(.*?)\1', content)
         if host_match:
             host = host_match.group(2)
             logger.info(f"✓ 在 main.py 中找到主机配置: {host}")
@@ -134,19 +146,19 @@ def check_venv_status():
     else:
         logger.warning(f"⚠ 未在虚拟环境中运行，可能导致依赖问题")
     
-    # 检查Flask是否已安装
+    # 检查Flask是否已安装（读取包元数据，无需导入Flask本身）
     try:
-        import flask
-        logger.info(f"✓ Flask已安装，版本: {flask.__version__}")
-    except ImportError:
+        v = version("flask")
+        logger.info(f"✓ Flask已安装，版本: {v}")
+    except PackageNotFoundError:
         logger.error(f"✗ Flask未安装")
         return False
     
     # 检查Flask-Restx是否已安装
     try:
-        import flask_restx
-        logger.info(f"✓ Flask-Restx已安装，版本: {flask_restx.__version__}")
-    except ImportError:
+        v = version("flask-restx")
+        logger.info(f"✓ Flask-Restx已安装，版本: {v}")
+    except PackageNotFoundError:
         logger.error(f"✗ Flask-Restx未安装")
         return False
     
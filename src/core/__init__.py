@@ -3,19 +3,11 @@
 
 """家庭网络安全监控系统 - 核心分析引擎"""
 
+import importlib
+
 __version__ = "1.0.0"
 __author__ = "Warefire Team"
 
-from .config import Config
-from .traffic_analyzer import TrafficAnalyzer
-from .signature_detection import SignatureDetector
-from .anomaly_detection import AnomalyDetector
-from .threat_intelligence import ThreatIntelligence
-from .device_manager import DeviceManager
-from .alert_engine import AlertEngine
-from .main import WarefireSystem
-from .utils import logger, setup_logging
-
 __all__ = [
     "Config",
     "TrafficAnalyzer",
@@ -28,3 +20,28 @@ __all__ = [
     "logger",
     "setup_logging"
 ]
+
+# 导出名称 -> 所在子模块，首次访问时才导入对应子模块，避免导入包时加载全部依赖
+_lazy = {
+    "Config": "config",
+    "TrafficAnalyzer": "traffic_analyzer",
+    "SignatureDetector": "signature_detection",
+    "AnomalyDetector": "anomaly_detection",
+    "ThreatIntelligence": "threat_intelligence",
+    "DeviceManager": "device_manager",
+    "AlertEngine": "alert_engine",
+    "WarefireSystem": "main",
+    "logger": "utils",
+    "setup_logging": "utils"
+}
+
+def __getattr__(name):
+    if name in _lazy:
+        module = importlib.import_module(f".{_lazy[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,18 +1,42 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import ast
+import itertools
+import json
+import operator
 import sqlite3
 import threading
 import time
+from collections import Counter, OrderedDict
+from datetime import datetime
 from typing import Dict, List, Optional
 
 from .config import Config
-from .utils import logger, get_current_timestamp, get_current_datetime
+from .utils import logger, get_current_timestamp
+
+# 告警写入语句，列顺序与 Alert.to_row() 一致
+_INSERT_SQL = "INSERT OR REPLACE INTO alerts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+# 告警状态变更只更新状态相关的列，避免重新序列化整行
+_UPDATE_STATUS_SQL = ("UPDATE alerts SET status = ?, acknowledged_by = ?, acknowledged_at = ?, "
+                      "resolved_by = ?, resolved_at = ? WHERE alert_id = ?")
+
+# get_alerts 允许过滤的列
+_FILTER_COLUMNS = frozenset({"alert_id", "alert_type", "severity", "source", "status", "acknowledged_by", "resolved_by"})
 
 class Alert:
     """告警类，代表一个安全事件告警"""
     
-    def __init__(self, alert_type: str, severity: str, source: str, description: str, details: Dict = None):
+    # 告警会被批量创建，使用 __slots__ 省去每个实例的 __dict__
+    __slots__ = ("alert_id", "timestamp", "alert_type", "severity", "source", "description", "details",
+                 "status", "acknowledged_by", "acknowledged_at", "resolved_by", "resolved_at", "_datetime_str")
+    
+    # 进程内单调递增的序号，保证同一秒内生成的告警ID不重复
+    _seq = itertools.count()
+    
+    def __init__(self, alert_type: str, severity: str, source: str, description: str, details: Dict = None,
+                 timestamp: int = None):
         """初始化告警
         
         Args:
@@ -21,9 +45,13 @@ class Alert:
             source: 告警来源
             description: 告警描述
             details: 告警详细信息
+            timestamp: 告警时间戳，默认为当前时间
         """
-        self.alert_id = f"alert_{get_current_timestamp()}_{int(time.time() * 1000) % 1000}"
-        self.timestamp = get_current_timestamp()
+        if timestamp is None:
+            timestamp = get_current_timestamp()
+        self.alert_id = f"alert_{timestamp}_{next(Alert._seq)}"
+        self.timestamp = timestamp
+        self._datetime_str = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
         self.alert_type = alert_type
         self.severity = severity.lower()  # low, medium, high, critical
         self.source = source
@@ -44,7 +72,7 @@ class Alert:
         return {
             "alert_id": self.alert_id,
             "timestamp": self.timestamp,
-            "datetime": get_current_datetime(),
+            "datetime": self._datetime_str,
             "alert_type": self.alert_type,
             "severity": self.severity,
             "source": self.source,
@@ -57,35 +85,71 @@ class Alert:
             "resolved_at": self.resolved_at
         }
     
-    def acknowledge(self, user: str) -> None:
+    def to_row(self) -> tuple:
+        """转换为数据库行
+        
+        Returns:
+            与alerts表列顺序一致的元组
+        """
+        return (
+            self.alert_id,
+            self.timestamp,
+            self.alert_type,
+            self.severity,
+            self.source,
+            self.description,
+            json.dumps(self.details, separators=(",", ":"), default=str),
+            self.status,
+            self.acknowledged_by,
+            self.acknowledged_at,
+            self.resolved_by,
+            self.resolved_at
+        )
+    
+    def acknowledge(self, user: str) -> str:
         """确认告警
         
         Args:
             user: 确认用户
+            
+        Returns:
+            变更前的状态
         """
+        prev_status = self.status
         self.status = "acknowledged"
         self.acknowledged_by = user
         self.acknowledged_at = get_current_timestamp()
+        return prev_status
     
-    def resolve(self, user: str) -> None:
+    def resolve(self, user: str) -> str:
         """解决告警
         
         Args:
             user: 解决用户
+            
+        Returns:
+            变更前的状态
         """
+        prev_status = self.status
         self.status = "resolved"
         self.resolved_by = user
         self.resolved_at = get_current_timestamp()
+        return prev_status
     
-    def close(self, user: str) -> None:
+    def close(self, user: str) -> str:
         """关闭告警
         
         Args:
             user: 关闭用户
+            
+        Returns:
+            变更前的状态
         """
+        prev_status = self.status
         self.status = "closed"
         self.resolved_by = user
         self.resolved_at = get_current_timestamp()
+        return prev_status
 
 class AlertEngine:
     """告警引擎，负责生成和管理告警"""
@@ -98,14 +162,41 @@ class AlertEngine:
         """
         self.config = config
         self.enabled = config.get("alert_engine.enabled", True)
-        self.alert_levels = config.get("alert_engine.alert_levels", ["info", "warning", "critical"])
-        self.notification_methods = config.get("alert_engine.notification_methods", ["web", "mobile"])
+        # 告警级别转为集合，便于每次创建告警时做哈希查找
+        self.alert_levels = frozenset(
+            level.lower() for level in config.get("alert_engine.alert_levels", ["info", "warning", "critical"])
+        )
+        self.notification_methods = tuple(
+            method.lower() for method in config.get("alert_engine.notification_methods", ["web", "mobile"])
+        )
         self.db_path = config.get("alert_engine.alert_db_path", "../../data/alerts.db")
         self.max_alerts_per_hour = config.get("alert_engine.max_alerts_per_hour", 100)
+        self.max_in_memory = config.get("alert_engine.max_alerts_in_memory", 10000)
         
-        self.alerts: Dict[str, Alert] = {}  # 告警ID -> 告警对象
+        # 告警ID -> 告警对象，按创建时间先后排列；超出上限的旧告警只保留在数据库中
+        self.alerts: "OrderedDict[str, Alert]" = OrderedDict()
         self.alert_count_in_last_hour = 0
-        self.last_hour_reset = get_current_timestamp()
+        # 每小时计数的重置基准使用单调时钟，不受系统时间调整影响
+        self._hour_reset_mono = time.monotonic()
+        
+        # 增量维护的统计计数，避免每次统计都遍历全部告警
+        self._by_status: Counter = Counter()
+        self._by_severity: Counter = Counter()
+        self._by_type: Counter = Counter()
+        
+        # 保护内存告警表、每小时计数和统计计数，清理定时器与请求线程会同时修改它们；
+        # 不在持有该锁时访问数据库，避免与 _db_lock 互相等待
+        self._alerts_lock = threading.Lock()
+        
+        # 通知方式 -> 发送方法
+        self._notifiers = {
+            "web": self._send_web_notification,
+            "mobile": self._send_mobile_notification
+        }
+        
+        # 数据库长连接，所有读写共享并由锁串行化
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
         
         # 初始化数据库
         self._init_database()
@@ -113,36 +204,41 @@ class AlertEngine:
         # 加载现有告警
         self._load_alerts()
         
-        # 启动清理线程
-        self.cleanup_thread = threading.Thread(target=self._cleanup_old_alerts, daemon=True)
-        self.cleanup_thread.start()
+        # 启动时立即清理一次，之后每24小时清理一次
+        self._cleanup_timer: Optional[threading.Timer] = None
+        self._schedule_cleanup(0)
     
     def _init_database(self) -> None:
-        """初始化数据库"""
+        """初始化数据库，并建立长连接供后续读写复用"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
             
             # 创建告警表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS alerts (
-                    alert_id TEXT PRIMARY KEY,
-                    timestamp INTEGER,
-                    alert_type TEXT,
-                    severity TEXT,
-                    source TEXT,
-                    description TEXT,
-                    details TEXT,
-                    status TEXT,
-                    acknowledged_by TEXT,
-                    acknowledged_at INTEGER,
-                    resolved_by TEXT,
-                    resolved_at INTEGER
-                )
-            """)
-            
-            conn.commit()
-            conn.close()
+            with self._db_lock:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS alerts (
+                        alert_id TEXT PRIMARY KEY,
+                        timestamp INTEGER,
+                        alert_type TEXT,
+                        severity TEXT,
+                        source TEXT,
+                        description TEXT,
+                        details TEXT,
+                        status TEXT,
+                        acknowledged_by TEXT,
+                        acknowledged_at INTEGER,
+                        resolved_by TEXT,
+                        resolved_at INTEGER
+                    )
+                """)
+                
+                # 为常用的排序和过滤列建立索引
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts(timestamp DESC)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_severity ON alerts(severity)")
         except Exception as e:
             logger.error(f"Error initializing alerts database: {e}")
     
@@ -151,34 +247,69 @@ class AlertEngine:
         logger.info(f"Loading alerts from {self.db_path}")
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._db_lock:
+                rows = self._conn.execute(
+                    "SELECT * FROM alerts ORDER BY timestamp DESC, rowid DESC LIMIT ?",
+                    (min(1000, self.max_in_memory),)
+                ).fetchall()
             
-            cursor.execute("SELECT * FROM alerts ORDER BY timestamp DESC LIMIT 1000")
-            rows = cursor.fetchall()
-            
-            for row in rows:
-                alert = Alert(
-                    alert_type=row[2],
-                    severity=row[3],
-                    source=row[4],
-                    description=row[5]
-                )
-                alert.alert_id = row[0]
-                alert.timestamp = row[1]
-                alert.details = eval(row[6]) if row[6] else {}
-                alert.status = row[7]
-                alert.acknowledged_by = row[8]
-                alert.acknowledged_at = row[9]
-                alert.resolved_by = row[10]
-                alert.resolved_at = row[11]
+            # 按时间先后插入，保持内存中告警的时间顺序
+            for row in reversed(rows):
+                alert = self._row_to_alert(row)
                 self.alerts[alert.alert_id] = alert
+                self._track(alert)
             
-            conn.close()
             logger.info(f"Loaded {len(self.alerts)} alerts")
         except Exception as e:
             logger.error(f"Error loading alerts: {e}")
     
+    def _row_to_alert(self, row: tuple) -> Alert:
+        """将数据库行转换为告警对象
+        
+        Args:
+            row: alerts表的一行
+            
+        Returns:
+            告警对象
+        """
+        alert = Alert(
+            alert_type=row[2],
+            severity=row[3],
+            source=row[4],
+            description=row[5],
+            timestamp=row[1]
+        )
+        alert.alert_id = row[0]
+        alert.details = self._parse_details(row[6])
+        alert.status = row[7]
+        alert.acknowledged_by = row[8]
+        alert.acknowledged_at = row[9]
+        alert.resolved_by = row[10]
+        alert.resolved_at = row[11]
+        return alert
+    
+    @staticmethod
+    def _parse_details(raw: str) -> Dict:
+        """解析数据库中保存的告警详细信息
+        
+        Args:
+            raw: details列的原始文本
+            
+        Returns:
+            告警详细信息字典
+        """
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            # 兼容旧版本以str(dict)方式写入的记录
+            try:
+                return ast.literal_eval(raw)
+            except (ValueError, SyntaxError):
+                logger.warning(f"Unable to parse alert details: {raw[:100]}")
+                return {}
+    
     def _save_alert_to_db(self, alert: Alert) -> None:
         """保存告警到数据库
         
@@ -186,31 +317,68 @@ class AlertEngine:
             alert: 告警对象
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO alerts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                alert.alert_id,
-                alert.timestamp,
-                alert.alert_type,
-                alert.severity,
-                alert.source,
-                alert.description,
-                str(alert.details),
-                alert.status,
-                alert.acknowledged_by,
-                alert.acknowledged_at,
-                alert.resolved_by,
-                alert.resolved_at
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self._db_lock:
+                self._conn.execute(_INSERT_SQL, alert.to_row())
         except Exception as e:
             logger.error(f"Error saving alert to database: {e}")
     
+    def _save_alerts_many(self, alerts: List[Alert]) -> None:
+        """在单个事务中批量保存告警
+        
+        Args:
+            alerts: 告警对象列表
+        """
+        if not alerts:
+            return
+        
+        rows = [alert.to_row() for alert in alerts]
+        try:
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(_INSERT_SQL, rows)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            logger.error(f"Error saving alerts to database: {e}")
+    
+    def _update_alert_status_in_db(self, alert: Alert) -> None:
+        """将告警状态变更写入数据库
+        
+        Args:
+            alert: 告警对象
+        """
+        try:
+            with self._db_lock:
+                self._conn.execute(_UPDATE_STATUS_SQL, (
+                    alert.status,
+                    alert.acknowledged_by,
+                    alert.acknowledged_at,
+                    alert.resolved_by,
+                    alert.resolved_at,
+                    alert.alert_id
+                ))
+        except Exception as e:
+            logger.error(f"Error updating alert status in database: {e}")
+    
+    def _delete_alerts_from_db(self, alert_ids: List[str]) -> None:
+        """从数据库中批量删除告警
+        
+        Args:
+            alert_ids: 告警ID列表
+        """
+        try:
+            with self._db_lock:
+                # 分批拼接占位符，避免超过SQLite的变量数量上限
+                for i in range(0, len(alert_ids), 500):
+                    chunk = alert_ids[i:i + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    self._conn.execute(f"DELETE FROM alerts WHERE alert_id IN ({placeholders})", chunk)
+        except Exception as e:
+            logger.error(f"Error deleting alerts from database: {e}")
+    
     def create_alert(self, alert_type: str, severity: str, source: str, description: str, details: Dict = None) -> Alert:
         """创建新告警
         
@@ -229,16 +397,6 @@ class AlertEngine:
             logger.warning(f"Alert severity {severity} not in configured levels, skipping")
             return
         
-        # 检查每小时告警数量限制
-        current_time = get_current_timestamp()
-        if current_time - self.last_hour_reset > 3600:
-            self.alert_count_in_last_hour = 0
-            self.last_hour_reset = current_time
-        
-        if self.alert_count_in_last_hour >= self.max_alerts_per_hour:
-            logger.warning(f"Exceeded maximum alerts per hour ({self.max_alerts_per_hour}), skipping")
-            return
-        
         # 创建告警
         alert = Alert(
             alert_type=alert_type,
@@ -248,14 +406,33 @@ class AlertEngine:
             details=details
         )
         
-        # 保存到内存和数据库
-        self.alerts[alert.alert_id] = alert
+        with self._alerts_lock:
+            # 检查每小时告警数量限制，检查和计数在同一把锁内完成
+            mono_now = time.monotonic()
+            if mono_now - self._hour_reset_mono > 3600:
+                self.alert_count_in_last_hour = 0
+                self._hour_reset_mono = mono_now
+            
+            if self.alert_count_in_last_hour >= self.max_alerts_per_hour:
+                logger.warning(f"Exceeded maximum alerts per hour ({self.max_alerts_per_hour}), skipping")
+                return
+            self.alert_count_in_last_hour += 1
+            
+            # 保存到内存
+            self.alerts[alert.alert_id] = alert
+            self._track(alert)
+            
+            # 超出内存上限时淘汰最早的告警，数据库中的记录仍然保留
+            while len(self.alerts) > self.max_in_memory:
+                _, evicted = self.alerts.popitem(last=False)
+                self._untrack(evicted)
+        
+        # 保存到数据库
         self._save_alert_to_db(alert)
         
         # 发送通知
         self._send_notifications(alert)
         
-        self.alert_count_in_last_hour += 1
         logger.info(f"Created new alert: {alert.alert_id} - {description}")
         
         return alert
@@ -267,10 +444,9 @@ class AlertEngine:
             alert: 告警对象
         """
         for method in self.notification_methods:
-            if method == "web":
-                self._send_web_notification(alert)
-            elif method == "mobile":
-                self._send_mobile_notification(alert)
+            sender = self._notifiers.get(method)
+            if sender:
+                sender(alert)
     
     def _send_web_notification(self, alert: Alert) -> None:
         """发送Web通知
@@ -294,34 +470,61 @@ class AlertEngine:
         """获取告警列表
         
         Args:
-            filters: 过滤条件
+            filters: 过滤条件，键必须是告警的可过滤字段
             limit: 返回数量限制
             offset: 偏移量
             
         Returns:
             告警列表
+            
+        Raises:
+            ValueError: 过滤条件中包含不支持的键
         """
-        # 从内存中获取告警
-        alerts = list(self.alerts.values())
-        
-        # 应用过滤条件
+        filters = filters or {}
+        unknown = filters.keys() - _FILTER_COLUMNS
+        if unknown:
+            raise ValueError(f"Unsupported alert filter keys: {', '.join(sorted(unknown))}")
+        
+        # 过滤列均来自白名单，可以安全地拼接到SQL中
+        sql = "SELECT * FROM alerts"
+        params: list = list(filters.values())
         if filters:
-            filtered_alerts = []
-            for alert in alerts:
-                match = True
-                for key, value in filters.items():
-                    if getattr(alert, key, None) != value:
-                        match = False
-                        break
-                if match:
-                    filtered_alerts.append(alert)
-            alerts = filtered_alerts
+            sql += " WHERE " + " AND ".join(f"{key} = ?" for key in filters)
         
-        # 按时间排序
-        alerts.sort(key=lambda x: x.timestamp, reverse=True)
+        # 按时间排序并分页，同一秒内的告警按写入先后倒序，与内存中的顺序一致
+        sql += " ORDER BY timestamp DESC, rowid DESC LIMIT ? OFFSET ?"
+        params.extend((limit, offset))
         
-        # 应用分页
-        return alerts[offset:offset+limit]
+        try:
+            with self._db_lock:
+                rows = self._conn.execute(sql, params).fetchall()
+        except Exception as e:
+            logger.error(f"Error querying alerts, falling back to in-memory alerts: {e}")
+            return self._filter_in_memory(filters, limit, offset)
+        
+        # 优先返回内存中的告警对象，保证调用方拿到的是同一实例
+        with self._alerts_lock:
+            cached = [self.alerts.get(row[0]) for row in rows]
+        return [alert or self._row_to_alert(row) for alert, row in zip(cached, rows)]
+    
+    def _filter_in_memory(self, filters: Dict, limit: int, offset: int) -> List[Alert]:
+        """在内存中的告警上执行过滤和分页
+        
+        Args:
+            filters: 过滤条件（键已校验）
+            limit: 返回数量限制
+            offset: 偏移量
+            
+        Returns:
+            告警列表
+        """
+        getters = [(operator.attrgetter(key), value) for key, value in filters.items()]
+        # 从最新的告警开始遍历，稳定排序后同一秒内的告警也是新的在前
+        with self._alerts_lock:
+            alerts = [alert for alert in reversed(self.alerts.values())
+                      if all(get(alert) == value for get, value in getters)]
+        alerts.sort(key=operator.attrgetter("timestamp"), reverse=True)
+        return alerts[offset:offset + limit]
     
     def get_alert(self, alert_id: str) -> Optional[Alert]:
         """根据ID获取告警
@@ -332,7 +535,19 @@ class AlertEngine:
         Returns:
             告警对象，不存在则返回None
         """
-        return self.alerts.get(alert_id)
+        with self._alerts_lock:
+            alert = self.alerts.get(alert_id)
+        if alert:
+            return alert
+        
+        # 已从内存中淘汰的告警回退到数据库查询
+        try:
+            with self._db_lock:
+                row = self._conn.execute("SELECT * FROM alerts WHERE alert_id = ?", (alert_id,)).fetchone()
+        except Exception as e:
+            logger.error(f"Error querying alert {alert_id}: {e}")
+            return None
+        return self._row_to_alert(row) if row else None
     
     def acknowledge_alert(self, alert_id: str, user: str) -> bool:
         """确认告警
@@ -344,13 +559,19 @@ class AlertEngine:
         Returns:
             是否确认成功
         """
-        alert = self.get_alert(alert_id)
-        if alert:
+        with self._alerts_lock:
+            alert = self.alerts.get(alert_id)
+            if alert is not None:
+                self._move_status(alert.acknowledge(user), alert.status)
+        if alert is None:
+            # 已从内存淘汰的告警从数据库加载
+            alert = self.get_alert(alert_id)
+            if not alert:
+                return False
             alert.acknowledge(user)
-            self._save_alert_to_db(alert)
-            logger.info(f"Alert {alert_id} acknowledged by {user}")
-            return True
-        return False
+        self._update_alert_status_in_db(alert)
+        logger.info(f"Alert {alert_id} acknowledged by {user}")
+        return True
     
     def resolve_alert(self, alert_id: str, user: str) -> bool:
         """解决告警
@@ -362,13 +583,19 @@ class AlertEngine:
         Returns:
             是否解决成功
         """
-        alert = self.get_alert(alert_id)
-        if alert:
+        with self._alerts_lock:
+            alert = self.alerts.get(alert_id)
+            if alert is not None:
+                self._move_status(alert.resolve(user), alert.status)
+        if alert is None:
+            # 已从内存淘汰的告警从数据库加载
+            alert = self.get_alert(alert_id)
+            if not alert:
+                return False
             alert.resolve(user)
-            self._save_alert_to_db(alert)
-            logger.info(f"Alert {alert_id} resolved by {user}")
-            return True
-        return False
+        self._update_alert_status_in_db(alert)
+        logger.info(f"Alert {alert_id} resolved by {user}")
+        return True
     
     def close_alert(self, alert_id: str, user: str) -> bool:
         """关闭告警
@@ -380,13 +607,19 @@ class AlertEngine:
         Returns:
             是否关闭成功
         """
-        alert = self.get_alert(alert_id)
-        if alert:
+        with self._alerts_lock:
+            alert = self.alerts.get(alert_id)
+            if alert is not None:
+                self._move_status(alert.close(user), alert.status)
+        if alert is None:
+            # 已从内存淘汰的告警从数据库加载
+            alert = self.get_alert(alert_id)
+            if not alert:
+                return False
             alert.close(user)
-            self._save_alert_to_db(alert)
-            logger.info(f"Alert {alert_id} closed by {user}")
-            return True
-        return False
+        self._update_alert_status_in_db(alert)
+        logger.info(f"Alert {alert_id} closed by {user}")
+        return True
     
     def delete_alert(self, alert_id: str) -> bool:
         """删除告警
@@ -397,38 +630,56 @@ class AlertEngine:
         Returns:
             是否删除成功
         """
-        alert = self.get_alert(alert_id)
-        if alert:
-            del self.alerts[alert_id]
-            
-            # 从数据库中删除
-            try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM alerts WHERE alert_id = ?", (alert_id,))
-                conn.commit()
-                conn.close()
-            except Exception as e:
-                logger.error(f"Error deleting alert from database: {e}")
-            
-            logger.info(f"Alert {alert_id} deleted")
-            return True
-        return False
+        with self._alerts_lock:
+            alert = self.alerts.pop(alert_id, None)
+            if alert is not None:
+                self._untrack(alert)
+        if alert is None and not self.get_alert(alert_id):
+            return False
+        
+        # 从数据库中删除
+        self._delete_alerts_from_db([alert_id])
+        
+        logger.info(f"Alert {alert_id} deleted")
+        return True
     
-    def _cleanup_old_alerts(self) -> None:
-        """清理旧告警"""
-        logger.info("Starting old alerts cleanup thread")
+    def _schedule_cleanup(self, delay: float) -> None:
+        """安排下一次旧告警清理
         
-        while True:
+        Args:
+            delay: 距下一次清理的秒数
+        """
+        self._cleanup_timer = threading.Timer(delay, self._cleanup_once)
+        self._cleanup_timer.daemon = True
+        self._cleanup_timer.start()
+    
+    def _cleanup_once(self) -> None:
+        """清理旧告警，完成后安排下一次清理"""
+        try:
             # 保留最近30天的告警
             thirty_days_ago = get_current_timestamp() - (30 * 24 * 3600)
-            old_alerts = [alert_id for alert_id, alert in self.alerts.items() if alert.timestamp < thirty_days_ago]
             
-            for alert_id in old_alerts:
-                self.delete_alert(alert_id)
+            # 数据库中的旧告警（包括已从内存淘汰的）一次性删除
+            with self._db_lock:
+                deleted = self._conn.execute("DELETE FROM alerts WHERE timestamp < ?", (thirty_days_ago,)).rowcount
             
-            # 每24小时清理一次
-            time.sleep(24 * 3600)
+            # 内存中的告警按时间先后排列，过期的都在队首，遇到第一个未过期的即可停止
+            # 扫描期间持有锁，防止 create_alert 同时插入或淘汰导致迭代出错
+            with self._alerts_lock:
+                expired = []
+                for alert_id, alert in self.alerts.items():
+                    if alert.timestamp >= thirty_days_ago:
+                        break
+                    expired.append(alert_id)
+                for alert_id in expired:
+                    self._untrack(self.alerts.pop(alert_id))
+            
+            if deleted:
+                logger.info(f"Cleaned up {deleted} old alerts")
+        except Exception as e:
+            logger.error(f"Error cleaning up old alerts: {e}")
+        finally:
+            self._schedule_cleanup(24 * 3600)
     
     def get_alert_stats(self) -> Dict:
         """获取告警统计信息
@@ -436,35 +687,45 @@ class AlertEngine:
         Returns:
             告警统计字典
         """
-        stats = {
-            "total_alerts": len(self.alerts),
-            "by_status": {
-                "new": 0,
-                "acknowledged": 0,
-                "resolved": 0,
-                "closed": 0
-            },
-            "by_severity": {
-                "low": 0,
-                "medium": 0,
-                "high": 0,
-                "critical": 0
-            },
-            "by_type": {}
-        }
+        by_status = dict.fromkeys(("new", "acknowledged", "resolved", "closed"), 0)
+        by_severity = dict.fromkeys(("low", "medium", "high", "critical"), 0)
+        
+        with self._alerts_lock:
+            by_status.update((k, v) for k, v in self._by_status.items() if k in by_status)
+            by_severity.update((k, v) for k, v in self._by_severity.items() if k in by_severity)
+            return {
+                "total_alerts": len(self.alerts),
+                "by_status": by_status,
+                "by_severity": by_severity,
+                "by_type": {k: v for k, v in self._by_type.items() if v > 0}
+            }
+    
+    def _track(self, alert: Alert) -> None:
+        """将告警计入统计，调用方需持有 _alerts_lock
         
-        for alert in self.alerts.values():
-            # 按状态统计
-            if alert.status in stats["by_status"]:
-                stats["by_status"][alert.status] += 1
-            
-            # 按严重程度统计
-            if alert.severity in stats["by_severity"]:
-                stats["by_severity"][alert.severity] += 1
-            
-            # 按类型统计
-            if alert.alert_type not in stats["by_type"]:
-                stats["by_type"][alert.alert_type] = 0
-            stats["by_type"][alert.alert_type] += 1
+        Args:
+            alert: 告警对象
+        """
+        self._by_status[alert.status] += 1
+        self._by_severity[alert.severity] += 1
+        self._by_type[alert.alert_type] += 1
+    
+    def _untrack(self, alert: Alert) -> None:
+        """将告警从统计中移除，调用方需持有 _alerts_lock
         
-        return stats
+        Args:
+            alert: 告警对象
+        """
+        self._by_status[alert.status] -= 1
+        self._by_severity[alert.severity] -= 1
+        self._by_type[alert.alert_type] -= 1
+    
+    def _move_status(self, old_status: str, new_status: str) -> None:
+        """更新状态统计，调用方需持有 _alerts_lock
+        
+        Args:
+            old_status: 变更前的状态
+            new_status: 变更后的状态
+        """
+        self._by_status[old_status] -= 1
+        self._by_status[new_status] += 1
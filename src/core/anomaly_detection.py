@@ -1,39 +1,451 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import base64
+import hashlib
 import os
-import json
+import sqlite3
 import threading
 import time
-from typing import Dict, List, Optional, Tuple
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
 
 from .config import Config
-from .utils import logger, get_current_timestamp, save_json_file, load_json_file
+from .utils import logger, get_current_timestamp, load_json_file, json_dumps, json_loads
+
+# 尝试导入scikit-learn的高斯混合模型，用于基于概率密度的异常评分
+try:
+    from sklearn.mixture import GaussianMixture
+    SKLEARN_AVAILABLE = True
+except ImportError as e:
+    SKLEARN_AVAILABLE = False
+    logger.warning(f"scikit-learn not available, falling back to z-score detection: {e}")
+
+# 尝试导入numba，用于JIT编译异常评分的内层循环，不可用时使用NumPy实现
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 基线表的列：数值数组按列分别以小端字节序BLOB保存，其余元数据保存为JSON
+_BASELINE_COLUMNS = {
+    "device_mac": "TEXT PRIMARY KEY",
+    "updated_at": "INTEGER",
+    "data": "TEXT",
+    "feature_names": "TEXT",
+    "samples": "INTEGER",
+    "mean": "BLOB",
+    "var": "BLOB",
+    "history": "BLOB",
+    "hourly_activity": "BLOB",
+    "domain_bloom": "BLOB"
+}
+
+# 基线写入语句
+_UPSERT_SQL = (f"INSERT OR REPLACE INTO baselines ({', '.join(_BASELINE_COLUMNS)}) "
+               f"VALUES ({', '.join('?' * len(_BASELINE_COLUMNS))})")
+
+# 旧版按设备保存的基线文件后缀
+_LEGACY_SUFFIX = ".baseline.json"
+
+# 默认参与异常评分的数值特征，与配置 anomaly_detection.features 的默认值一致
+DEFAULT_FEATURES = (
+    "bytes_in",
+    "bytes_out",
+    "packets_in",
+    "packets_out",
+    "connection_count",
+    "unique_domains",
+    "active_hours"
+)
+
+# 数值特征 -> 从行为数据中提取该特征的函数
+_FEATURE_EXTRACTORS = {
+    "bytes_in": lambda b: (b.get("traffic") or {}).get("bytes_in", 0),
+    "bytes_out": lambda b: (b.get("traffic") or {}).get("bytes_out", 0),
+    "packets_in": lambda b: (b.get("traffic") or {}).get("packets_in", 0),
+    "packets_out": lambda b: (b.get("traffic") or {}).get("packets_out", 0),
+    "connection_count": lambda b: len(b.get("connections") or ()),
+    "unique_domains": lambda b: len(set((b.get("domains") or {}).get("visited", ()))),
+    "active_hours": lambda b: len((b.get("traffic") or {}).get("active_hours", ()))
+}
+
+# 指数加权均值/方差的平滑系数，样本较少时退化为算术平均
+_EWM_ALPHA = 0.1
+
+# 开始按基线评分前至少需要的样本数
+_MIN_SAMPLES = 3
+
+# 每个基线保留的最近特征向量数量（按小时更新约一周），用于拟合高斯混合模型
+_HISTORY_SIZE = 168
+
+# 每个设备已访问域名的布隆过滤器：容量1024个域名、误判率约1%时需要约9600位和7个哈希函数
+_DOMAIN_BLOOM_BITS = 9600
+_DOMAIN_BLOOM_HASHES = 7
+
+# 异常评分结果缓存的容量
+_SCORE_CACHE_SIZE = 1024
+
+# 拟合高斯混合模型至少需要的样本数和模型分量数
+_GMM_MIN_SAMPLES = 24
+_GMM_COMPONENTS = 3
+
+# 更新线程检查待拟合模型队列的间隔（秒）
+_MODEL_FIT_POLL_SECONDS = 5.0
+
+# z分数映射到 [0, 1) 时的尺度，z=3 约对应 0.63
+_Z_SCALE = 3.0
+
+def _mac_to_int(mac: str) -> Optional[int]:
+    """将MAC地址转换为48位整数，分隔符和大小写不影响结果
+    
+    Args:
+        mac: MAC地址，以冒号或连字符分隔
+        
+    Returns:
+        48位整数，格式无效时返回None
+    """
+    digits = mac.replace(':', '').replace('-', '')
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+def extract_feature_vector(behavior_data: Dict, feature_names: Sequence[str]) -> np.ndarray:
+    """将行为数据转换为固定顺序的特征向量
+    
+    Args:
+        behavior_data: 行为数据
+        feature_names: 特征名称列表
+        
+    Returns:
+        float32 特征向量，未知特征取0
+    """
+    vec = np.zeros(len(feature_names), dtype=np.float32)
+    for i, name in enumerate(feature_names):
+        extractor = _FEATURE_EXTRACTORS.get(name)
+        if extractor:
+            try:
+                vec[i] = extractor(behavior_data)
+            except (TypeError, ValueError):
+                pass
+    return vec
+
+def _max_zscore_numpy(vec: np.ndarray, mean: np.ndarray, inv_std: np.ndarray) -> float:
+    """计算各特征z分数的最大值
+    
+    Args:
+        vec: 当前特征向量
+        mean: 基线均值
+        inv_std: 基线标准差的倒数
+        
+    Returns:
+        最大z分数
+    """
+    return float((np.abs(vec - mean) * inv_std).max(initial=0.0))
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _max_zscore(vec, mean, inv_std):
+        best = 0.0
+        for i in range(vec.shape[0]):
+            z = abs(vec[i] - mean[i]) * inv_std[i]
+            if z > best:
+                best = z
+        return best
+else:
+    _max_zscore = _max_zscore_numpy
+
+class _BloomFilter:
+    """固定大小的布隆过滤器，用于以常数内存判断元素是否出现过"""
+    
+    def __init__(self, num_bits: int = _DOMAIN_BLOOM_BITS, num_hashes: int = _DOMAIN_BLOOM_HASHES,
+                 data: bytes = None):
+        """初始化布隆过滤器
+        
+        Args:
+            num_bits: 位数组大小
+            num_hashes: 哈希函数个数
+            data: 已有的位数组内容
+        """
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        size = (num_bits + 7) // 8
+        self.bits = bytearray(data) if data and len(data) == size else bytearray(size)
+    
+    def _positions(self, item: str):
+        """计算元素对应的位位置（双重哈希）
+        
+        Args:
+            item: 元素
+            
+        Returns:
+            位位置的生成器
+        """
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+    
+    def add(self, item: str) -> None:
+        """加入元素
+        
+        Args:
+            item: 元素
+        """
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+    
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+def _encode_array(arr: np.ndarray, dtype: str) -> str:
+    """将数组按指定字节序类型编码为base64字符串
+    
+    Args:
+        arr: 数组
+        dtype: 带字节序的NumPy类型，如 "<u2"
+        
+    Returns:
+        base64字符串
+    """
+    return base64.b64encode(np.ascontiguousarray(arr, dtype=dtype).tobytes()).decode("ascii")
+
+def _decode_array(data, dtype: str, out_dtype) -> np.ndarray:
+    """解码 _encode_array 的结果，兼容旧版保存的数值列表
+    
+    Args:
+        data: base64字符串或数值列表
+        dtype: 编码时使用的NumPy类型
+        out_dtype: 返回数组的类型
+        
+    Returns:
+        一维数组
+    """
+    if isinstance(data, str):
+        return np.frombuffer(base64.b64decode(data), dtype=dtype).astype(out_dtype)
+    return np.array(data, dtype=out_dtype)
+
+class _LFUCache:
+    """容量固定的LFU缓存，满时淘汰使用次数最少的条目（次数相同时淘汰最早的）"""
+    
+    def __init__(self, capacity: int):
+        """初始化缓存
+        
+        Args:
+            capacity: 最大条目数
+        """
+        self.capacity = capacity
+        self._entries: Dict[Hashable, list] = {}  # 键 -> [值, 使用次数]
+        self._by_freq: Dict[int, OrderedDict] = {}  # 使用次数 -> 按加入顺序排列的键
+        self._min_freq = 0
+    
+    def get(self, key: Hashable):
+        """读取缓存
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            缓存值，不存在则返回None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._touch(key, entry)
+        return entry[0]
+    
+    def put(self, key: Hashable, value) -> None:
+        """写入缓存
+        
+        Args:
+            key: 缓存键
+            value: 缓存值
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[0] = value
+            self._touch(key, entry)
+            return
+        
+        if len(self._entries) >= self.capacity:
+            evicted, _ = self._by_freq[self._min_freq].popitem(last=False)
+            del self._entries[evicted]
+        
+        self._entries[key] = [value, 1]
+        self._by_freq.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+    
+    def _touch(self, key: Hashable, entry: list) -> None:
+        """增加条目的使用次数
+        
+        Args:
+            key: 缓存键
+            entry: 缓存条目
+        """
+        freq = entry[1]
+        bucket = self._by_freq[freq]
+        del bucket[key]
+        if not bucket:
+            del self._by_freq[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        entry[1] = freq + 1
+        self._by_freq.setdefault(freq + 1, OrderedDict())[key] = None
+    
+    def discard_if(self, predicate) -> None:
+        """删除键满足条件的所有条目
+        
+        Args:
+            predicate: 接收缓存键、返回是否删除的函数
+        """
+        for key in [key for key in self._entries if predicate(key)]:
+            freq = self._entries.pop(key)[1]
+            bucket = self._by_freq[freq]
+            del bucket[key]
+            if not bucket:
+                del self._by_freq[freq]
+        self._min_freq = min(self._by_freq, default=0)
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._by_freq.clear()
+        self._min_freq = 0
 
 class BehaviorBaseline:
-    """设备行为基线类"""
+    """设备行为基线类
+    
+    数值特征以 NumPy 数组保存（每个统计量一个数组，按特征顺序排列），
+    更新和检测都是整向量运算，不再逐项遍历字典。
+    """
     
-    def __init__(self, device_mac: str):
+    def __init__(self, device_mac: str, feature_names: Sequence[str] = None):
         """初始化行为基线
         
         Args:
             device_mac: 设备MAC地址
+            feature_names: 数值特征名称列表，默认为 DEFAULT_FEATURES
         """
         self.device_mac = device_mac
-        self.created_at = get_current_timestamp()
-        self.updated_at = get_current_timestamp()
+        self.created_at = self.updated_at = get_current_timestamp()
+        self.feature_names = tuple(feature_names or DEFAULT_FEATURES)
+        
+        # 数值特征的统计量
+        dim = len(self.feature_names)
+        self.samples = 0
+        self.mean = np.zeros(dim, dtype=np.float32)
+        self.var = np.zeros(dim, dtype=np.float32)
+        self.hourly_activity = np.zeros(24, dtype=np.uint16)  # 按小时统计的活动次数，达到上限后不再增加
+        self.history = np.zeros((0, dim), dtype=np.float32)  # 最近的特征向量，每行一次观测
+        self.domain_bloom = _BloomFilter()  # 访问过的域名
+        
         self.features = {
-            "daily_traffic": {},  # 按天统计的流量
-            "hourly_activity": {},  # 按小时统计的活动情况
-            "connection_patterns": {},  # 连接模式
-            "domain_visits": {},  # 访问的域名统计
-            "port_usage": {},  # 端口使用情况
-            "protocol_distribution": {}  # 协议分布
+            "connection_patterns": Counter(),  # 连接模式：对端 -> 出现次数
+            "domain_visits": {},  # 访问的域名统计（成员判断见 domain_bloom）
+            "port_usage": Counter(),  # 端口使用情况：端口 -> 使用次数
+            "protocol_distribution": Counter()  # 协议分布：协议 -> 次数
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict, feature_names: Sequence[str] = None) -> "BehaviorBaseline":
+        """从字典恢复行为基线
+        
+        Args:
+            data: to_dict() 生成的字典
+            feature_names: 当前配置的特征名称列表，与保存时不一致则重新建立数值统计
+            
+        Returns:
+            行为基线对象
+        """
+        baseline = cls(data["device_mac"], feature_names)
+        baseline.created_at = data.get("created_at", baseline.created_at)
+        baseline.updated_at = data.get("updated_at", baseline.updated_at)
+        
+        features = data.get("features") or {}
+        for name, current in baseline.features.items():
+            if isinstance(features.get(name), dict):
+                baseline.features[name] = type(current)(features[name])
+        
+        bloom = data.get("domain_bloom")
+        if isinstance(bloom, str):
+            bloom = base64.b64decode(bloom)
+        if isinstance(bloom, bytes):
+            baseline.domain_bloom = _BloomFilter(data=bloom)
         
+        hourly = features.get("hourly_activity")
+        if isinstance(hourly, (list, str, np.ndarray)):
+            hourly = _decode_array(hourly, "<u2", np.uint16)
+            if len(hourly) == 24:
+                baseline.hourly_activity = hourly
+        
+        stats = data.get("stats") or {}
+        if tuple(stats.get("feature_names", ())) == baseline.feature_names:
+            baseline.samples = int(stats.get("samples", 0))
+            baseline.mean = np.array(stats["mean"], dtype=np.float32)
+            baseline.var = np.array(stats["var"], dtype=np.float32)
+            dim = len(baseline.feature_names)
+            history = stats.get("history", ())
+            if isinstance(history, str):
+                history = _decode_array(history, "<f4", np.float32)
+                history = history[:len(history) - len(history) % dim].reshape(-1, dim)
+            else:
+                history = np.array(history, dtype=np.float32)
+            if history.ndim == 2 and history.shape[1] == dim:
+                baseline.history = history[-_HISTORY_SIZE:]
+        
+        return baseline
+    
     def update(self, behavior_data: Dict) -> None:
         """更新行为基线
         
+        Args:
+            behavior_data: 行为数据
+        """
+        # 更新数值特征统计
+        self._update_feature_stats(extract_feature_vector(behavior_data, self.feature_names))
+        self._update_behavior(behavior_data)
+    
+    @staticmethod
+    def update_many(baselines: List["BehaviorBaseline"], behaviors: List[Dict]) -> None:
+        """批量更新多个基线，数值特征统计在一次矩阵运算中完成
+        
+        所有基线的特征名称需一致。
+        
+        Args:
+            baselines: 行为基线列表
+            behaviors: 与基线一一对应的行为数据列表
+        """
+        if not baselines:
+            return
+        
+        feature_names = baselines[0].feature_names
+        x = np.stack([extract_feature_vector(b, feature_names) for b in behaviors])
+        mean = np.stack([b.mean for b in baselines])
+        var = np.stack([b.var for b in baselines])
+        samples = np.fromiter((b.samples for b in baselines), dtype=np.float32, count=len(baselines))
+        
+        alpha = np.maximum(_EWM_ALPHA, 1.0 / (samples + 1))[:, np.newaxis]
+        delta = x - mean
+        mean += alpha * delta
+        var = (1.0 - alpha) * (var + alpha * delta * delta)
+        
+        for i, (baseline, behavior_data) in enumerate(zip(baselines, behaviors)):
+            baseline.mean = mean[i]
+            baseline.var = var[i]
+            baseline.samples += 1
+            baseline._append_history(x[i])
+            baseline._update_behavior(behavior_data)
+    
+    def _update_behavior(self, behavior_data: Dict) -> None:
+        """更新数值特征以外的行为统计
+        
         Args:
             behavior_data: 行为数据
         """
@@ -59,22 +471,54 @@ class BehaviorBaseline:
         
         self.updated_at = get_current_timestamp()
     
+    def _update_feature_stats(self, vec: np.ndarray) -> None:
+        """用一次观测更新数值特征的指数加权均值和方差
+        
+        Args:
+            vec: 特征向量
+        """
+        alpha = max(_EWM_ALPHA, 1.0 / (self.samples + 1))
+        delta = vec - self.mean
+        self.mean += alpha * delta
+        self.var = (1.0 - alpha) * (self.var + alpha * delta * delta)
+        self.samples += 1
+        self._append_history(vec)
+    
+    def _append_history(self, vec: np.ndarray) -> None:
+        """记录一次观测，只保留最近 _HISTORY_SIZE 次
+        
+        Args:
+            vec: 特征向量
+        """
+        self.history = np.concatenate((self.history[-(_HISTORY_SIZE - 1):], vec[np.newaxis, :]))
+    
     def _update_traffic_stats(self, traffic_data: Dict) -> None:
         """更新流量统计
         
         Args:
             traffic_data: 流量数据
         """
-        # 简化实现，实际应该按天和小时统计
-        pass
+        # 行为数据给出了活跃小时时按小时批量计数，否则有流量时计入当前小时
+        hours = traffic_data.get("active_hours")
+        if hours:
+            counts = np.bincount(np.asarray(hours, dtype=np.intp) % 24, minlength=24)
+        elif traffic_data.get("bytes_in", 0) or traffic_data.get("bytes_out", 0):
+            counts = np.zeros(24, dtype=np.intp)
+            counts[time.localtime().tm_hour] = 1
+        else:
+            return
+        
+        # 在更宽的类型上相加后截断，避免uint16溢出回绕
+        limit = np.iinfo(np.uint16).max
+        self.hourly_activity = np.minimum(self.hourly_activity.astype(np.intp) + counts, limit).astype(np.uint16)
     
     def _update_connection_patterns(self, connection_data: Dict) -> None:
         """更新连接模式
         
         Args:
-            connection_data: 连接数据
+            connection_data: 连接数据，对端 -> 连接信息
         """
-        pass
+        self.features["connection_patterns"].update(map(str, connection_data))
     
     def _update_domain_visits(self, domain_data: Dict) -> None:
         """更新域名访问
@@ -82,23 +526,45 @@ class BehaviorBaseline:
         Args:
             domain_data: 域名数据
         """
-        pass
+        for domain in domain_data.get("visited", ()):
+            self.domain_bloom.add(domain)
+    
+    def new_domain_score(self, current_behavior: Dict) -> float:
+        """访问新域名带来的附加异常分数
+        
+        上游标记的新域名，或者不在已访问域名布隆过滤器中的域名，都视为新域名。
+        
+        Args:
+            current_behavior: 当前行为数据
+            
+        Returns:
+            附加分数
+        """
+        domains = current_behavior.get("domains")
+        if not domains:
+            return 0.0
+        if domains.get("new", []):
+            return 0.3
+        if any(domain not in self.domain_bloom for domain in domains.get("visited", ())):
+            return 0.3
+        return 0.0
     
     def _update_port_usage(self, port_data: Dict) -> None:
         """更新端口使用
         
         Args:
-            port_data: 端口数据
+            port_data: 端口数据，"used" 为本次使用的端口列表
         """
-        pass
+        # 端口统一以字符串为键，与从JSON恢复的键一致
+        self.features["port_usage"].update(map(str, port_data.get("used", ())))
     
     def _update_protocol_distribution(self, protocol_data: Dict) -> None:
         """更新协议分布
         
         Args:
-            protocol_data: 协议数据
+            protocol_data: 协议数据，协议 -> 次数
         """
-        pass
+        self.features["protocol_distribution"].update(protocol_data)
     
     def detect_anomaly(self, current_behavior: Dict) -> Tuple[bool, float]:
         """检测异常行为
@@ -109,21 +575,16 @@ class BehaviorBaseline:
         Returns:
             (是否异常, 异常分数)
         """
-        # 简化的异常检测算法，实际应该使用机器学习模型
         anomaly_score = 0.0
         
-        # 示例：检查流量是否超过基线的200%
-        if "traffic" in current_behavior:
-            current_bytes = current_behavior["traffic"].get("bytes_out", 0)
-            # 这里应该与基线比较，计算异常分数
-            # 简化实现，返回固定分数
-            anomaly_score = 0.5
+        # 数值特征：取偏离基线最大的特征的z分数，映射到 [0, 1)
+        if self.samples >= _MIN_SAMPLES:
+            vec = extract_feature_vector(current_behavior, self.feature_names)
+            inv_std = (1.0 / (np.sqrt(self.var) + 1e-6)).astype(np.float32)
+            anomaly_score = float(1.0 - np.exp(-float(_max_zscore(vec, self.mean, inv_std)) / _Z_SCALE))
         
-        # 示例：检查是否访问了新的域名
-        if "domains" in current_behavior:
-            new_domains = current_behavior["domains"].get("new", [])
-            if new_domains:
-                anomaly_score += 0.3
+        # 检查是否访问了新的域名
+        anomaly_score = min(1.0, anomaly_score + self.new_domain_score(current_behavior))
         
         # 如果异常分数超过阈值，认为是异常
         is_anomaly = anomaly_score > 0.7
@@ -139,7 +600,15 @@ class BehaviorBaseline:
             "device_mac": self.device_mac,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
-            "features": self.features
+            "features": dict(self.features, hourly_activity=_encode_array(self.hourly_activity, "<u2")),
+            "domain_bloom": base64.b64encode(bytes(self.domain_bloom.bits)).decode("ascii"),
+            "stats": {
+                "feature_names": list(self.feature_names),
+                "samples": self.samples,
+                "mean": self.mean.tolist(),
+                "var": self.var.tolist(),
+                "history": _encode_array(self.history, "<f4")
+            }
         }
 
 class AnomalyDetector:
@@ -157,40 +626,168 @@ class AnomalyDetector:
         self.enabled = config.get("anomaly_detection.enabled", True)
         self.baseline_update_interval = config.get("anomaly_detection.baseline_update_interval_hours", 24) * 3600
         self.detection_threshold = config.get("anomaly_detection.detection_threshold", 0.95)
-        self.features = config.get("anomaly_detection.features", [])
+        self.features = tuple(config.get("anomaly_detection.features", DEFAULT_FEATURES))
         
         self.baselines: Dict[str, BehaviorBaseline] = {}  # MAC地址 -> 行为基线
+        self._lock = threading.RLock()  # 保护基线、模型和缓存，检测线程与更新线程共用
+        self.gmms: Dict[str, "GaussianMixture"] = {}  # MAC地址 -> 高斯混合模型
+        self._gmm_train_ll: Dict[str, np.ndarray] = {}  # MAC地址 -> 训练样本的对数似然（升序）
+        self._gmm_failed: Dict[str, int] = {}  # MAC地址 -> 拟合失败时的样本数，样本数不变时不再重试
+        self._pending_fits: Set[str] = set()  # 检测时发现需要拟合模型的MAC地址，由更新线程拟合
+        self._dirty: Set[str] = set()  # 检测时更新、尚未写入数据库的基线MAC地址
+        self._last_updated = 0  # 所有基线中最近的更新时间
+        # (MAC地址, 特征向量字节, 是否有新域名) -> 基于模型的评分结果，模型重新拟合时失效
+        self._score_cache = _LFUCache(_SCORE_CACHE_SIZE)
         self.models_dir = "../../data/models"
+        self.db_path = config.get("anomaly_detection.baseline_db_path", "../../data/baselines.db")
         self.is_running = False
         self.update_thread = None
+        self._stop_event = threading.Event()  # 置位后更新线程立即退出等待
+        
+        # 数据库长连接，所有读写共享并由锁串行化
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
         
         # 确保模型目录存在
         if not os.path.exists(self.models_dir):
             os.makedirs(self.models_dir)
         
+        self._init_database()
+        
         # 加载现有基线
         self.load_baselines()
     
+    def _init_database(self) -> None:
+        """初始化基线数据库，并建立长连接供后续读写复用"""
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            
+            with self._db_lock:
+                columns = ", ".join(f"{name} {kind}" for name, kind in _BASELINE_COLUMNS.items())
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS baselines ({columns})")
+                
+                # 旧版表只有 device_mac/updated_at/data 三列，补齐缺少的列
+                existing = {row[1] for row in self._conn.execute("PRAGMA table_info(baselines)")}
+                for name, kind in _BASELINE_COLUMNS.items():
+                    if name not in existing:
+                        self._conn.execute(f"ALTER TABLE baselines ADD COLUMN {name} {kind}")
+        except Exception as e:
+            logger.error(f"Error initializing baseline database: {e}")
+    
     def load_baselines(self) -> None:
         """加载行为基线"""
         logger.info("Loading behavior baselines")
         
         try:
-            for file in os.listdir(self.models_dir):
-                if file.endswith(".baseline.json"):
-                    file_path = os.path.join(self.models_dir, file)
-                    baseline_data = load_json_file(file_path)
-                    if "device_mac" in baseline_data:
-                        baseline = BehaviorBaseline(baseline_data["device_mac"])
-                        baseline.created_at = baseline_data.get("created_at", get_current_timestamp())
-                        baseline.updated_at = baseline_data.get("updated_at", get_current_timestamp())
-                        baseline.features = baseline_data.get("features", baseline.features)
-                        self.baselines[baseline.device_mac] = baseline
+            with self._db_lock:
+                rows = self._conn.execute(
+                    "SELECT data, feature_names, samples, mean, var, history, hourly_activity, domain_bloom "
+                    "FROM baselines"
+                ).fetchall()
+            
+            for row in rows:
+                baseline = BehaviorBaseline.from_dict(self._row_to_dict(row), self.features)
+                self.baselines[baseline.device_mac] = baseline
+            
+            self._import_legacy_baselines()
+            
+            self._last_updated = max((b.updated_at for b in self.baselines.values()), default=0)
             
             logger.info(f"Loaded {len(self.baselines)} behavior baselines")
         except Exception as e:
             logger.error(f"Error loading baselines: {e}")
     
+    def _import_legacy_baselines(self) -> None:
+        """导入旧版按设备保存的JSON基线文件中尚未入库的基线"""
+        # 文件名是把冒号替换为连字符的MAC地址，按整数形式比较，已入库的不再解析
+        known = {_mac_to_int(mac) for mac in self.baselines}
+        known.discard(None)
+        with os.scandir(self.models_dir) as it:
+            paths = [
+                entry.path for entry in it
+                if entry.name.endswith(_LEGACY_SUFFIX)
+                and _mac_to_int(entry.name[:-len(_LEGACY_SUFFIX)]) not in known
+            ]
+        if not paths:
+            return
+        
+        # 文件读取是IO密集型操作，用线程池并行读取和解析
+        imported = []
+        with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+            for baseline_data in executor.map(load_json_file, paths):
+                if "device_mac" in baseline_data:
+                    baseline = BehaviorBaseline.from_dict(baseline_data, self.features)
+                    self.baselines[baseline.device_mac] = baseline
+                    imported.append(baseline)
+        
+        if imported:
+            self.save_baselines(imported)
+            logger.info(f"Imported {len(imported)} legacy baseline files")
+    
+    @staticmethod
+    def _baseline_to_row(baseline: BehaviorBaseline) -> tuple:
+        """转换为数据库行
+        
+        Args:
+            baseline: 行为基线对象
+            
+        Returns:
+            与 _BASELINE_COLUMNS 顺序一致的元组
+        """
+        meta = {
+            "device_mac": baseline.device_mac,
+            "created_at": baseline.created_at,
+            "updated_at": baseline.updated_at,
+            "features": baseline.features
+        }
+        return (
+            baseline.device_mac,
+            baseline.updated_at,
+            json_dumps(meta),
+            json_dumps(list(baseline.feature_names)),
+            baseline.samples,
+            baseline.mean.astype("<f4").tobytes(),
+            baseline.var.astype("<f4").tobytes(),
+            baseline.history.astype("<f4").tobytes(),
+            baseline.hourly_activity.astype("<u2").tobytes(),
+            bytes(baseline.domain_bloom.bits)
+        )
+    
+    @staticmethod
+    def _row_to_dict(row: tuple) -> Dict:
+        """将数据库行转换为 BehaviorBaseline.from_dict 接受的字典
+        
+        Args:
+            row: (data, feature_names, samples, mean, var, history, hourly_activity, domain_bloom)
+            
+        Returns:
+            行为基线字典
+        """
+        data, feature_names, samples, mean, var, history, hourly, bloom = row
+        result = json_loads(data)
+        
+        # 旧版行的所有内容都在 data 中
+        if mean is None:
+            return result
+        
+        feature_names = json_loads(feature_names)
+        result["features"]["hourly_activity"] = np.frombuffer(hourly, dtype="<u2")
+        result["domain_bloom"] = bloom
+        result["stats"] = {
+            "feature_names": feature_names,
+            "samples": samples,
+            "mean": np.frombuffer(mean, dtype="<f4"),
+            "var": np.frombuffer(var, dtype="<f4"),
+            "history": np.frombuffer(history, dtype="<f4").reshape(-1, len(feature_names))
+        }
+        return result
+    
     def save_baseline(self, baseline: BehaviorBaseline) -> None:
         """保存行为基线
         
@@ -198,13 +795,33 @@ class AnomalyDetector:
             baseline: 行为基线对象
         """
         try:
-            # Replace colons with hyphens in MAC address for Windows compatibility
-            safe_mac = baseline.device_mac.replace(':', '-')
-            file_path = os.path.join(self.models_dir, f"{safe_mac}.baseline.json")
-            save_json_file(baseline.to_dict(), file_path)
+            with self._db_lock:
+                self._conn.execute(_UPSERT_SQL, self._baseline_to_row(baseline))
         except Exception as e:
             logger.error(f"Error saving baseline for {baseline.device_mac}: {e}")
     
+    def save_baselines(self, baselines: List[BehaviorBaseline]) -> None:
+        """在一个事务中批量保存行为基线
+        
+        Args:
+            baselines: 行为基线对象列表
+        """
+        if not baselines:
+            return
+        
+        rows = [self._baseline_to_row(baseline) for baseline in baselines]
+        try:
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(_UPSERT_SQL, rows)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            logger.error(f"Error saving baselines: {e}")
+    
     def start(self) -> None:
         """启动异常行为检测器"""
         if not self.enabled:
@@ -217,11 +834,17 @@ class AnomalyDetector:
         
         logger.info("Starting anomaly detector...")
         
+        # 预先触发JIT编译，避免首次检测时的编译延迟
+        if NUMBA_AVAILABLE:
+            dummy = np.zeros(len(self.features), dtype=np.float32)
+            _max_zscore(dummy, dummy, dummy)
+        
         # 启动基线更新线程
+        self._stop_event.clear()
+        self.is_running = True
         self.update_thread = threading.Thread(target=self._update_baselines_loop, daemon=True)
         self.update_thread.start()
         
-        self.is_running = True
         logger.info("Anomaly detector started successfully")
     
     def stop(self) -> None:
@@ -232,51 +855,212 @@ class AnomalyDetector:
         logger.info("Stopping anomaly detector...")
         
         self.is_running = False
+        self._stop_event.set()
         
         # 等待更新线程结束
         if self.update_thread and self.update_thread.is_alive():
             self.update_thread.join(timeout=5)
         
+        # 写入检测期间更新的基线
+        self.flush()
+        
         logger.info("Anomaly detector stopped")
     
     def _update_baselines_loop(self) -> None:
         """基线更新循环"""
         logger.info("Starting baselines update loop")
         
-        while self.is_running:
-            # 更新所有基线
-            for mac, device in self.device_manager.devices.items():
-                self.update_device_baseline(mac)
+        while not self._stop_event.is_set():
+            deadline = time.monotonic() + 3600
+            self._run_update_cycle()
             
-            # 每小时检查一次
-            time.sleep(3600)
+            # 每小时更新一次，按截止时间等待以扣除本轮耗时；等待期间定期拟合检测时排队的模型，stop() 会立即唤醒
+            while not self._stop_event.wait(max(0.0, min(_MODEL_FIT_POLL_SECONDS, deadline - time.monotonic()))):
+                self._fit_pending_models()
+                if time.monotonic() >= deadline:
+                    break
         
         logger.info("Stopped baselines update loop")
     
+    def flush(self, baselines: List[BehaviorBaseline] = None) -> None:
+        """在一个事务中写入所有待保存的基线
+        
+        Args:
+            baselines: 需要一并写入的基线列表
+        """
+        with self._lock:
+            pending = {baseline.device_mac: baseline for baseline in baselines or ()}
+            for mac in self._dirty:
+                if mac in self.baselines:
+                    pending.setdefault(mac, self.baselines[mac])
+            self._dirty.clear()
+            self.save_baselines(list(pending.values()))
+    
+    def _mark_dirty(self, baseline: BehaviorBaseline) -> None:
+        """记录检测时更新的基线，等待统一写入
+        
+        Args:
+            baseline: 行为基线对象
+        """
+        self._dirty.add(baseline.device_mac)
+        self._last_updated = max(self._last_updated, baseline.updated_at)
+    
+    def _run_update_cycle(self) -> None:
+        """用所有设备的当前行为批量更新基线，并在一个事务中写入"""
+        try:
+            # 设备表可能被扫描线程同时修改，先复制一份快照再遍历
+            devices = list(self.device_manager.devices.items())
+            behaviors = [self._get_device_behavior(device) for _, device in devices]
+            
+            with self._lock:
+                baselines = [self._get_or_create_baseline(mac) for mac, _ in devices]
+                
+                # 特征与当前配置一致的基线一起做矩阵更新，其余逐个更新
+                batch = [i for i, b in enumerate(baselines) if b.feature_names == self.features]
+                BehaviorBaseline.update_many([baselines[i] for i in batch], [behaviors[i] for i in batch])
+                batched = set(batch)
+                for i, baseline in enumerate(baselines):
+                    if i not in batched:
+                        baseline.update(behaviors[i])
+                
+                if baselines:
+                    self._last_updated = max(self._last_updated, max(b.updated_at for b in baselines))
+                
+                self.flush(baselines)
+            
+            # 模型拟合较慢，在锁外进行；拟合成功时会清除该设备的缓存评分
+            for baseline in baselines:
+                self._fit_gmm(baseline)
+        except Exception as e:
+            logger.error(f"Error updating baselines: {e}")
+    
     def update_device_baseline(self, device_mac: str) -> None:
         """更新设备行为基线
         
         Args:
             device_mac: 设备MAC地址
         """
+        with self._lock:
+            baseline = self._update_baseline(device_mac)
+            if baseline:
+                self.save_baseline(baseline)
+        
+        if baseline:
+            self._fit_gmm(baseline)
+    
+    def _update_baseline(self, device_mac: str) -> Optional[BehaviorBaseline]:
+        """用设备当前行为更新内存中的基线，不写入数据库
+        
+        Args:
+            device_mac: 设备MAC地址
+            
+        Returns:
+            更新后的行为基线，设备不存在则返回None
+        """
         device = self.device_manager.get_device(device_mac)
         if not device:
-            return
+            return None
         
         # 获取设备当前行为数据
         behavior_data = self._get_device_behavior(device)
         
-        # 获取或创建基线
-        baseline = self.baselines.get(device_mac)
-        if not baseline:
-            baseline = BehaviorBaseline(device_mac)
-            self.baselines[device_mac] = baseline
-        
         # 更新基线
+        baseline = self._get_or_create_baseline(device_mac)
         baseline.update(behavior_data)
+        self._last_updated = max(self._last_updated, baseline.updated_at)
+        return baseline
+    
+    def _get_or_create_baseline(self, device_mac: str) -> BehaviorBaseline:
+        """获取设备基线，不存在则创建
         
-        # 保存基线
-        self.save_baseline(baseline)
+        Args:
+            device_mac: 设备MAC地址
+            
+        Returns:
+            行为基线对象
+        """
+        with self._lock:
+            baseline = self.baselines.get(device_mac)
+            if not baseline:
+                baseline = BehaviorBaseline(device_mac, self.features)
+                self.baselines[device_mac] = baseline
+            return baseline
+    
+    def _fit_pending_models(self) -> None:
+        """拟合检测时排队的模型，在锁外进行"""
+        with self._lock:
+            pending, self._pending_fits = self._pending_fits, set()
+            baselines = [self.baselines[mac] for mac in pending if mac in self.baselines]
+        
+        for baseline in baselines:
+            self._fit_gmm(baseline)
+    
+    def _fit_gmm(self, baseline: BehaviorBaseline) -> None:
+        """用基线的历史观测重新拟合高斯混合模型，不能在持有 self._lock 时调用
+        
+        拟合成功后清除该设备的缓存评分；拟合失败时记录当时的样本数，样本数增加前不再重试。
+        
+        Args:
+            baseline: 行为基线对象
+        """
+        device_mac = baseline.device_mac
+        if not SKLEARN_AVAILABLE or len(baseline.history) < _GMM_MIN_SAMPLES:
+            return
+        if self._gmm_failed.get(device_mac) == baseline.samples:
+            return
+        
+        try:
+            # 流量类特征跨越多个数量级，取对数后再建模；对角协方差使每个样本的计算量为 O(D)
+            x = np.log1p(baseline.history)
+            gmm = GaussianMixture(n_components=_GMM_COMPONENTS, covariance_type="diag", reg_covar=1e-3,
+                                  random_state=0)
+            gmm.fit(x)
+            train_ll = np.sort(gmm.score_samples(x))
+            with self._lock:
+                self._gmm_train_ll[device_mac] = train_ll
+                self.gmms[device_mac] = gmm
+                self._gmm_failed.pop(device_mac, None)
+                self._score_cache.discard_if(lambda key: key[0] == device_mac)
+        except Exception as e:
+            self._gmm_failed[device_mac] = baseline.samples
+            logger.error(f"Error fitting model for {device_mac}: {e}")
+    
+    def _score(self, baseline: BehaviorBaseline, current_behavior: Dict) -> Tuple[bool, float]:
+        """计算当前行为的异常分数
+        
+        有拟合好的高斯混合模型时，分数为训练样本中似然高于当前行为的比例，
+        与检测阈值比较；否则使用基线的z分数检测。检测路径上不拟合模型，
+        样本足够但还没有模型的设备交给更新线程拟合。
+        
+        Args:
+            baseline: 行为基线对象
+            current_behavior: 当前行为数据
+            
+        Returns:
+            (是否异常, 异常分数)
+        """
+        gmm = self.gmms.get(baseline.device_mac)
+        if gmm is None:
+            if (SKLEARN_AVAILABLE and len(baseline.history) >= _GMM_MIN_SAMPLES
+                    and self._gmm_failed.get(baseline.device_mac) != baseline.samples):
+                self._pending_fits.add(baseline.device_mac)
+            return baseline.detect_anomaly(current_behavior)
+        
+        # 同一模型下评分只取决于特征向量和是否访问新域名，相同的行为快照直接复用结果
+        vec = extract_feature_vector(current_behavior, baseline.feature_names)
+        domain_score = baseline.new_domain_score(current_behavior)
+        cache_key = (baseline.device_mac, vec.tobytes(), domain_score)
+        cached = self._score_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        ll = gmm.score_samples(np.log1p(vec)[np.newaxis, :])[0]
+        train_ll = self._gmm_train_ll[baseline.device_mac]
+        score = 1.0 - np.searchsorted(train_ll, ll) / len(train_ll)
+        score = min(1.0, float(score) + domain_score)
+        result = (score > self.detection_threshold, score)
+        self._score_cache.put(cache_key, result)
+        return result
     
     def _get_device_behavior(self, device) -> Dict:
         """获取设备当前行为数据
@@ -306,26 +1090,28 @@ class AnomalyDetector:
         Returns:
             异常检测结果
         """
-        # 如果没有基线，先创建基线
-        if device_mac not in self.baselines:
-            baseline = BehaviorBaseline(device_mac)
+        with self._lock:
+            baseline = self.baselines.get(device_mac)
+            
+            # 如果没有基线，先创建基线
+            if baseline is None:
+                baseline = BehaviorBaseline(device_mac, self.features)
+                baseline.update(current_behavior)
+                self.baselines[device_mac] = baseline
+                self._mark_dirty(baseline)
+                return {
+                    "is_anomaly": False,
+                    "score": 0.0,
+                    "reason": "No baseline available yet",
+                    "timestamp": get_current_timestamp()
+                }
+            
+            # 使用基线检测异常
+            is_anomaly, score = self._score(baseline, current_behavior)
+            
+            # 更新基线，由更新循环或 stop() 统一写入数据库
             baseline.update(current_behavior)
-            self.baselines[device_mac] = baseline
-            self.save_baseline(baseline)
-            return {
-                "is_anomaly": False,
-                "score": 0.0,
-                "reason": "No baseline available yet",
-                "timestamp": get_current_timestamp()
-            }
-        
-        # 使用基线检测异常
-        baseline = self.baselines[device_mac]
-        is_anomaly, score = baseline.detect_anomaly(current_behavior)
-        
-        # 更新基线
-        baseline.update(current_behavior)
-        self.save_baseline(baseline)
+            self._mark_dirty(baseline)
         
         result = {
             "is_anomaly": is_anomaly,
@@ -374,7 +1160,7 @@ class AnomalyDetector:
             "total_baselines": len(self.baselines),
             "feature_count": len(self.features),
             "detection_threshold": self.detection_threshold,
-            "last_updated": max(b.updated_at for b in self.baselines.values()) if self.baselines else 0
+            "last_updated": self._last_updated
         }
     
     def get_device_baseline(self, device_mac: str) -> Optional[Dict]:
@@ -386,7 +1172,8 @@ class AnomalyDetector:
         Returns:
             设备行为基线字典，不存在则返回None
         """
-        baseline = self.baselines.get(device_mac)
-        if baseline:
-            return baseline.to_dict()
+        with self._lock:
+            baseline = self.baselines.get(device_mac)
+            if baseline:
+                return baseline.to_dict()
         return None
@@ -2,12 +2,102 @@
 # -*- coding: utf-8 -*-
 
 import os
-import json
-from typing import Dict, Any
+import pickle
+import sys
+from types import MappingProxyType
+from typing import Dict, Any, Callable, Iterator, List, Mapping, Optional, Tuple
+
+from .utils import logger, json_dumpb, json_loads
+
+# 尝试导入ijson库，用于流式解析较大的配置文件
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# 配置文件达到该大小时（且ijson可用）按顶层配置段流式解析，避免整个文件同时驻留内存
+_STREAM_THRESHOLD_BYTES = 1 << 20
+
+# 配置文件路径 -> (修改时间, 文件大小, 序列化后的解析结果)，文件未变化时跳过读取和解析
+_PARSE_CACHE: Dict[str, Tuple[int, int, bytes]] = {}
+
+# 各枚举型配置项的合法取值
+_MODES = frozenset(("learning", "detection"))
+_LOG_LEVELS = frozenset(("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"))
+_BACKUP_FREQUENCIES = frozenset(("daily", "weekly", "monthly"))
+_THEMES = frozenset(("light", "dark", "auto"))
+
+
+def _one_of(choices: frozenset) -> Callable[[Any], bool]:
+    """生成检查取值是否属于给定选项集合的校验函数"""
+    def check(value: Any) -> bool:
+        try:
+            return value in choices
+        except TypeError:
+            # 列表、字典等不可哈希的值不可能是合法选项
+            return False
+    return check
+
+
+def _in_range(low: float, high: float) -> Callable[[Any], bool]:
+    """生成检查取值是否为闭区间内数值的校验函数"""
+    return lambda value: isinstance(value, (int, float)) and low <= value <= high
+
+
+# 声明式验证规则：配置键 -> (校验函数, 无效时使用的默认值, 描述, 是否逐个验证字典子项)
+# 新增需要验证的配置项时只需在这里加一行
+_VALIDATION_RULES: Dict[str, Tuple[Callable[[Any], bool], Any, str, bool]] = {
+    "system.mode": (_one_of(_MODES), "learning", "系统模式", False),
+    "system.log_level": (_one_of(_LOG_LEVELS), "INFO", "日志级别", False),
+    "anomaly_detection.detection_threshold": (_in_range(0, 1), 0.95, "检测阈值", False),
+    "performance.threads": (lambda value: isinstance(value, (int, float)) and value >= 1, 1, "线程数", True),
+    "backup.schedule.frequency": (_one_of(_BACKUP_FREQUENCIES), "daily", "备份频率", False),
+    "ui.theme": (_one_of(_THEMES), "dark", "主题设置", False),
+}
+
+def _freeze(value: Any) -> Any:
+    """递归生成配置的只读副本：字典转为 MappingProxyType，列表转为元组
+    
+    Args:
+        value: 配置值
+        
+    Returns:
+        只读的配置值
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+# 可以直接按值比较的标量类型，合并时这些类型的相同值视为未变化
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+# 点分隔键 -> 拆分后的路径元组，每个键在进程内只拆分一次
+_KEY_PATHS: Dict[str, Tuple[str, ...]] = {}
+
+
+def _key_path(key: str) -> Tuple[str, ...]:
+    """获取点分隔键拆分后的路径
+    
+    Args:
+        key: 配置键，如 "system.mode"
+        
+    Returns:
+        Tuple[str, ...]: 路径元组
+    """
+    path = _KEY_PATHS.get(key)
+    if path is None:
+        path = _KEY_PATHS.setdefault(key, tuple(sys.intern(k) for k in key.split('.')))
+    return path
 
 class Config:
     """配置管理类"""
     
+    # 序列化后的默认配置模板
+    _default_config_bytes: bytes = None
+    
     def __init__(self, config_path: str = None):
         """初始化配置
         
@@ -15,22 +105,35 @@ class Config:
             config_path: 配置文件路径，默认使用默认配置
         """
         self.config: Dict[str, Any] = self._load_default_config()
-        self._observers = []  # 配置变更观察者列表
+        self._observers: Dict[Callable, None] = {}  # 配置变更观察者，用字典保持注册顺序并支持O(1)查找
+        self._pending_changes: Optional[List[Tuple[str, Any, Any]]] = None  # 批量加载期间暂存的变更
+        self._flat: Dict[str, Any] = {}  # 点分隔键 -> 配置值，包含所有中间节点
+        self._version = 0  # 配置版本号，每次变更后递增
+        self._snapshot: Optional[Tuple[int, Mapping[str, Any]]] = None  # (版本号, 只读快照)
         
+        # 初始化期间配置尚未对外可见：合并配置文件时不通知观察者，也不逐键更新索引
+        self._initializing = True
         if config_path and os.path.exists(config_path):
             self._load_config(config_path)
+        self._initializing = False
         
-        # 初始验证配置
+        # 合并完成后一次性建立索引，再做初始验证
+        self._reflatten()
         self.validate_config()
     
     def add_observer(self, observer: callable) -> None:
         """添加配置变更观察者
         
         Args:
-            observer: 观察者函数，接收参数(key, old_value, new_value)
+            observer: 观察者函数，接收参数(key, old_value, new_value)；
+                如果同时提供 notify_batch(changes) 方法，加载配置文件时会一次性收到全部变更
+            
+        Raises:
+            TypeError: observer 不可调用
         """
-        if observer not in self._observers:
-            self._observers.append(observer)
+        if not callable(observer):
+            raise TypeError(f"配置观察者必须可调用: {observer!r}")
+        self._observers.setdefault(observer, None)
     
     def remove_observer(self, observer: callable) -> None:
         """移除配置变更观察者
@@ -38,8 +141,7 @@ class Config:
         Args:
             observer: 要移除的观察者函数
         """
-        if observer in self._observers:
-            self._observers.remove(observer)
+        self._observers.pop(observer, None)
     
     def _notify_observers(self, key: str, old_value: Any, new_value: Any) -> None:
         """通知所有观察者配置已变更
@@ -49,14 +151,72 @@ class Config:
             old_value: 旧值
             new_value: 新值
         """
-        for observer in self._observers:
+        # 初始化期间或没有观察者时无需通知，也无需为批量通知暂存变更
+        if self._initializing or not self._observers:
+            return
+        
+        # 批量加载期间只记录变更，加载完成后统一通知
+        if self._pending_changes is not None:
+            self._pending_changes.append((key, old_value, new_value))
+            return
+        
+        self._call_observers(lambda observer: observer(key, old_value, new_value))
+    
+    def _notify_batch(self, changes: List[Tuple[str, Any, Any]]) -> None:
+        """批量通知所有观察者配置已变更
+        
+        提供 notify_batch 方法的观察者一次收到全部变更，其余观察者按顺序逐条收到通知。
+        
+        Args:
+            changes: (key, old_value, new_value) 列表
+        """
+        if not changes or not self._observers:
+            return
+        
+        def invoke(observer: Callable) -> None:
+            notify_batch = getattr(observer, "notify_batch", None)
+            if notify_batch is not None:
+                notify_batch(changes)
+            else:
+                for key, old_value, new_value in changes:
+                    observer(key, old_value, new_value)
+        
+        self._call_observers(invoke)
+    
+    def _call_observers(self, invoke: Callable[[Callable], None]) -> None:
+        """依次对每个观察者执行通知
+        
+        正常情况下整个循环只进入一次 try；某个观察者抛出异常时记录日志并将其移除，
+        然后从下一个观察者继续通知。
+        
+        Args:
+            invoke: 接收观察者并完成一次通知的函数
+        """
+        observers = list(self._observers)
+        index = 0
+        while index < len(observers):
             try:
-                observer(key, old_value, new_value)
+                for observer in observers[index:]:
+                    invoke(observer)
+                    index += 1
             except Exception as e:
-                print(f"通知观察者时出错: {e}")
-        
+                offender = observers[index]
+                index += 1
+                logger.error("通知配置观察者 %r 时出错，已移除该观察者: %s", offender, e)
+                self.remove_observer(offender)
+    
     def _load_default_config(self) -> Dict[str, Any]:
-        """加载默认配置"""
+        """加载默认配置
+        
+        默认配置只在首次使用时构建一次并序列化缓存在类上，之后每个实例从中反序列化出独立的副本。
+        """
+        if Config._default_config_bytes is None:
+            Config._default_config_bytes = pickle.dumps(self._build_default_config(), protocol=pickle.HIGHEST_PROTOCOL)
+        return pickle.loads(Config._default_config_bytes)
+    
+    @staticmethod
+    def _build_default_config() -> Dict[str, Any]:
+        """构建默认配置"""
         return {
             # 系统配置
             "system": {
@@ -133,6 +293,7 @@ class Config:
                 "enabled": True,
                 "baseline_update_interval_hours": 24,
                 "detection_threshold": 0.95,
+                "baseline_db_path": "../../data/baselines.db",
                 "features": [
                     "bytes_in",
                     "bytes_out",
@@ -172,7 +333,9 @@ class Config:
                 "device_db_path": "../../data/devices.db",
                 "unknown_device_alert": True,
                 "main_router_ip": "",  # 主路由器IP地址
-                "include_local_machine": False  # 是否将本机加入设备管理
+                "include_local_machine": False,  # 是否将本机加入设备管理
+                "identify_workers": 16,  # 并行识别设备（nmap、DNS查询）的线程数
+                "db_snapshot_interval_seconds": 0  # 大于0时设备库在内存中读写并按此间隔写回磁盘，0为直接读写磁盘
             },
             
             # 告警引擎配置
@@ -181,7 +344,8 @@ class Config:
                 "alert_levels": ["info", "warning", "critical"],
                 "notification_methods": ["web", "mobile"],
                 "alert_db_path": "../../data/alerts.db",
-                "max_alerts_per_hour": 100
+                "max_alerts_per_hour": 100,
+                "max_alerts_in_memory": 10000  # 内存中缓存的告警上限，更早的告警只保存在数据库中
             },
             
             # 性能配置
@@ -301,14 +465,125 @@ class Config:
         }
     
     def _load_config(self, config_path: str) -> None:
-        """从文件加载配置"""
+        """从文件加载配置
+        
+        顶层键既可以是嵌套的配置段（{"ui": {"theme": "light"}}），也可以是点分隔的配置键
+        （{"ui.theme": "light"}），后者只沿该路径合并，两种写法可以混用。
+        
+        Args:
+            config_path: 配置文件路径
+        """
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                custom_config = json.load(f)
-                # 合并配置
-                self._merge_config(self.config, custom_config)
+            # 合并配置，期间的变更暂存起来，合并完成后统一通知
+            self._pending_changes = []
+            try:
+                for key, value in self._iter_config_sections(config_path):
+                    if "." in key:
+                        # 点分隔键展开为只包含该路径的嵌套字典
+                        path = _key_path(key)
+                        for part in reversed(path[1:]):
+                            value = {part: value}
+                        key = path[0]
+                    self._merge_config(self.config, {key: value})
+            finally:
+                changes, self._pending_changes = self._pending_changes, None
+            self._notify_batch(changes)
         except Exception as e:
-            print(f"Error loading config file: {e}")
+            logger.error("Error loading config file %s: %s", config_path, e)
+    
+    @staticmethod
+    def _iter_config_sections(config_path: str) -> Iterator[Tuple[str, Any]]:
+        """逐个读取配置文件中的顶层配置段
+        
+        大文件在ijson可用时流式解析，每次只构建一个顶层配置段；其余情况整体解析（带缓存）。
+        
+        Args:
+            config_path: 配置文件路径
+            
+        Returns:
+            Iterator[Tuple[str, Any]]: (顶层键, 配置值) 迭代器
+        """
+        if IJSON_AVAILABLE and os.path.getsize(config_path) >= _STREAM_THRESHOLD_BYTES:
+            with open(config_path, 'rb') as f:
+                # use_float 使小数解析为 float 而不是 Decimal，与 json 模块一致
+                yield from ijson.kvitems(f, "", use_float=True)
+            return
+        
+        yield from Config._parse_config_file(config_path).items()
+    
+    @staticmethod
+    def _parse_config_file(config_path: str) -> Dict[str, Any]:
+        """读取并解析配置文件，按修改时间和大小缓存解析结果
+        
+        Args:
+            config_path: 配置文件路径
+            
+        Returns:
+            Dict[str, Any]: 解析出的配置，每次调用返回独立的副本
+        """
+        st = os.stat(config_path)
+        cached = _PARSE_CACHE.get(config_path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return pickle.loads(cached[2])
+        
+        with open(config_path, 'rb') as f:
+            custom_config = json_loads(f.read())
+        # 只缓存解析成功的结果
+        _PARSE_CACHE[config_path] = (st.st_mtime_ns, st.st_size, pickle.dumps(custom_config, protocol=pickle.HIGHEST_PROTOCOL))
+        return custom_config
+    
+    @staticmethod
+    def _flatten(node: Dict[str, Any], prefix: str, out: Dict[str, Any]) -> None:
+        """将嵌套配置展开为点分隔键
+        
+        Args:
+            node: 配置字典
+            prefix: 当前节点的点分隔键前缀
+            out: 输出的扁平字典
+        """
+        # 驻留嵌套字典的键和字符串值（从JSON或pickle恢复的都是新建的字符串），保持原有顺序
+        items = [(sys.intern(k) if isinstance(k, str) else k, sys.intern(v) if isinstance(v, str) else v)
+                 for k, v in node.items()]
+        node.clear()
+        node.update(items)
+        
+        for key, value in items:
+            full_key = sys.intern(f"{prefix}.{key}" if prefix else key)
+            out[full_key] = value
+            if isinstance(value, dict):
+                Config._flatten(value, full_key, out)
+    
+    def _reflatten(self, key: str = None) -> None:
+        """重建扁平索引
+        
+        Args:
+            key: 变更的配置键，只重建该子树；为None时重建全部
+        """
+        # 初始化结束时会整体重建一次，期间的逐键更新可以跳过
+        if self._initializing and key is not None:
+            return
+        
+        # 所有配置变更都经过这里，索引更新即视为配置版本变化
+        self._version += 1
+        
+        if key is None:
+            self._flat = {}
+            self._flatten(self.config, "", self._flat)
+            return
+        
+        # 删除该键及其子键，再按当前值重新展开
+        prefix = key + "."
+        for k in [k for k in self._flat if k == key or k.startswith(prefix)]:
+            del self._flat[k]
+        
+        value = self.config
+        parts = _key_path(key)
+        for i, part in enumerate(parts):
+            value = value[part]
+            # 沿途新建的中间节点也需要加入索引
+            self._flat[sys.intern('.'.join(parts[:i + 1]))] = value
+        if isinstance(value, dict):
+            self._flatten(value, key, self._flat)
     
     def _merge_config(self, base: Dict[str, Any], custom: Dict[str, Any], parent_key: str = "") -> None:
         """合并配置字典，支持观察者通知
@@ -318,18 +593,36 @@ class Config:
             custom: 自定义配置字典
             parent_key: 父配置键，用于构建完整的配置路径
         """
-        for key, value in custom.items():
-            full_key = f"{parent_key}.{key}" if parent_key else key
+        # 没有观察者时整个合并过程都跳过通知调用
+        notify = self._notify_observers if self._observers else None
+        
+        # 用显式栈代替递归，栈中保存各层尚未处理完的键值迭代器，通知顺序与深度优先递归一致
+        stack = [(base, iter(custom.items()), parent_key)]
+        while stack:
+            node, items, prefix = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+                continue
             
-            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                # 递归合并字典
-                self._merge_config(base[key], value, full_key)
+            key, value = item
+            full_key = f"{prefix}.{key}" if prefix else key
+            
+            # 旧值同时用于判断是否需要进入下一层和通知观察者，只查找一次
+            old_value = node.get(key)
+            if isinstance(old_value, dict) and isinstance(value, dict):
+                # 进入下一层合并
+                stack.append((old_value, iter(value.items()), full_key))
+            elif (type(old_value) is type(value) and isinstance(value, _SCALAR_TYPES)
+                    and old_value == value and key in node):
+                # 值未变化，跳过写入、索引更新和通知
+                continue
             else:
-                # 保存旧值用于通知
-                old_value = base[key] if key in base else None
-                base[key] = value
+                node[key] = value
+                self._reflatten(full_key)
                 # 通知观察者配置变更
-                self._notify_observers(full_key, old_value, value)
+                if notify is not None:
+                    notify(full_key, old_value, value)
     
     def get(self, key: str, default: Any = None) -> Any:
         """获取配置值，支持点分隔符
@@ -341,15 +634,59 @@ class Config:
         Returns:
             配置值
         """
-        keys = key.split('.')
-        value = self.config
+        return self._flat.get(key, default)
+    
+    def snapshot(self) -> Mapping[str, Any]:
+        """获取当前配置的只读快照
         
-        try:
-            for k in keys:
-                value = value[k]
-            return value
-        except (KeyError, TypeError):
-            return default
+        快照在配置版本不变时复用同一对象，调用方可以直接共享引用而无需防御性拷贝；
+        配置变更后下次调用会生成新的快照，已取得的旧快照保持不变。
+        
+        Returns:
+            Mapping[str, Any]: 只读的嵌套配置
+        """
+        if self._snapshot is None or self._snapshot[0] != self._version:
+            self._snapshot = (self._version, _freeze(self.config))
+        return self._snapshot[1]
+    
+    @property
+    def version(self) -> int:
+        """配置版本号
+        
+        每次 set 或合并配置后递增，调用方可以据此缓存由配置派生的值，版本变化时再重新计算。
+        
+        Returns:
+            int: 当前版本号
+        """
+        return self._version
+    
+    def _validate_rule(self, key: str) -> bool:
+        """按 _VALIDATION_RULES 中的规则验证一个配置项，无效时重置为默认值
+        
+        Args:
+            key: 配置键
+            
+        Returns:
+            bool: 配置项是否有效
+        """
+        check, default, label, per_item = _VALIDATION_RULES[key]
+        
+        if not per_item:
+            value = self.get(key)
+            if check(value):
+                return True
+            logger.warning("无效的%s: %s，默认使用 %s", label, value, default)
+            self.set(key, default)
+            return False
+        
+        # 逐个验证字典中的子项
+        valid = True
+        for item, value in list(self.get(key, {}).items()):
+            if not check(value):
+                logger.warning("%s %s无效: %s，默认使用 %s", item, label, value, default)
+                self.set(f"{key}.{item}", default)
+                valid = False
+        return valid
     
     def validate_config(self) -> bool:
         """验证配置的有效性
@@ -358,49 +695,27 @@ class Config:
             bool: 配置是否有效
         """
         valid = True
+        for key in _VALIDATION_RULES:
+            valid = self._validate_rule(key) and valid
+        return valid
+    
+    def _validate_key(self, key: str) -> bool:
+        """只验证受指定配置键变更影响的配置项
         
-        # 验证系统模式
-        system_mode = self.get("system.mode")
-        if system_mode not in ["learning", "detection"]:
-            print(f"警告: 无效的系统模式: {system_mode}，默认使用 learning")
-            self.set("system.mode", "learning")
-            valid = False
-        
-        # 验证日志级别
-        log_level = self.get("system.log_level")
-        if log_level not in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
-            print(f"警告: 无效的日志级别: {log_level}，默认使用 INFO")
-            self.set("system.log_level", "INFO")
-            valid = False
-        
-        # 验证检测阈值
-        detection_threshold = self.get("anomaly_detection.detection_threshold")
-        if not (0 <= detection_threshold <= 1):
-            print(f"警告: 无效的检测阈值: {detection_threshold}，默认使用 0.95")
-            self.set("anomaly_detection.detection_threshold", 0.95)
-            valid = False
-        
-        # 验证线程数
-        for component, threads in self.get("performance.threads").items():
-            if threads < 1:
-                print(f"警告: {component} 线程数无效: {threads}，默认使用 1")
-                self.set(f"performance.threads.{component}", 1)
-                valid = False
-        
-        # 验证备份频率
-        backup_frequency = self.get("backup.schedule.frequency")
-        if backup_frequency not in ["daily", "weekly", "monthly"]:
-            print(f"警告: 无效的备份频率: {backup_frequency}，默认使用 daily")
-            self.set("backup.schedule.frequency", "daily")
-            valid = False
-        
-        # 验证主题设置
-        theme = self.get("ui.theme")
-        if theme not in ["light", "dark", "auto"]:
-            print(f"警告: 无效的主题设置: {theme}，默认使用 dark")
-            self.set("ui.theme", "dark")
-            valid = False
+        变更键与验证键相同、是其祖先节点或位于其子树中时运行对应验证。
         
+        Args:
+            key: 变更的配置键
+            
+        Returns:
+            bool: 相关配置是否有效
+        """
+        valid = True
+        for rule_key in _VALIDATION_RULES:
+            if (key == rule_key
+                    or rule_key.startswith(key + ".")
+                    or key.startswith(rule_key + ".")):
+                valid = self._validate_rule(rule_key) and valid
         return valid
     
     def set(self, key: str, value: Any) -> None:
@@ -410,7 +725,7 @@ class Config:
             key: 配置键，如 "system.mode"
             value: 配置值
         """
-        keys = key.split('.')
+        keys = _key_path(key)
         config = self.config
         
         # 获取旧值
@@ -424,21 +739,31 @@ class Config:
         
         # 设置新值
         config[keys[-1]] = value
+        self._reflatten(key)
         
         # 通知观察者
         self._notify_observers(key, old_value, value)
         
-        # 设置后验证配置
-        self.validate_config()
+        # 设置后只验证受影响的配置项
+        self._validate_key(key)
     
-    def save(self, config_path: str) -> None:
+    def save(self, config_path: str, pretty: bool = True) -> None:
         """保存配置到文件
         
+        先写入同目录下的临时文件再原子替换，写入过程中崩溃不会留下不完整的配置文件。
+        
         Args:
             config_path: 配置文件路径
+            pretty: 是否缩进排版；不需要人工编辑的部署可以传False输出紧凑JSON，序列化更快
         """
+        tmp_path = config_path + ".tmp"
         try:
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+            # 先在内存中完成序列化，再以二进制方式一次写入；orjson直接输出字节串，无需再编码
+            data = json_dumpb(self.config, indent=pretty)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, config_path)
         except Exception as e:
-            print(f"Error saving config file: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            logger.error("Error saving config file %s: %s", config_path, e)
@@ -1,19 +1,359 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import ctypes
+import functools
+import io
+import operator
+import os
+import socket
+import struct
 import subprocess
 import re
+import shutil
 import sqlite3
 import sys
-from typing import Dict, List, Optional
+import threading
+import time
+from types import MappingProxyType
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from datetime import datetime
+from xml.etree import ElementTree
 
 from .config import Config
-from .utils import logger, get_current_timestamp, is_ip_address
+from .utils import logger, get_current_timestamp, is_ip_address, json_dumps, json_loads
+
+# arp输出中MAC地址允许的字符，分隔符的位置另行检查
+_MAC_CHARS = b"0123456789abcdefABCDEF:-"
+
+# Linux内核的ARP缓存表，可以直接读取结构化的行，无需启动arp进程再用正则解析
+_PROC_NET_ARP = "/proc/net/arp"
+
+# Windows IP Helper API 返回的ARP表项（MIB_IPNETROW）
+class _MibIpNetRow(ctypes.Structure):
+    _fields_ = [
+        ("dwIndex", ctypes.c_uint32),
+        ("dwPhysAddrLen", ctypes.c_uint32),
+        ("bPhysAddr", ctypes.c_ubyte * 8),
+        ("dwAddr", ctypes.c_uint32),  # 网络字节序
+        ("dwType", ctypes.c_uint32),
+    ]
+
+_MIB_IPNET_TYPE_INVALID = 2
+_ERROR_INSUFFICIENT_BUFFER = 122
+_ERROR_NO_DATA = 232  # ARP表为空
+
+# 批量nmap扫描的总超时和单个主机的超时
+_NMAP_TIMEOUT_SECONDS = 60
+_NMAP_HOST_TIMEOUT = "10s"
+
+# nmap识别结果中写回设备的字段
+_NMAP_FIELDS = ("os", "device_type", "hostname")
+
+# ipconfig /all（Windows）和 ifconfig（Linux/macOS）输出中的本机MAC地址
+_MAC_WIN_RE = re.compile(r"Physical Address.*?: ([0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2})")
+_MAC_UNIX_RE = re.compile(r"ether ([0-9a-f:]{17})")
+
+# nslookup反向查询结果中的主机名
+_NSLOOKUP_NAME_RE = re.compile(r"name\s*=\s*(.+?)\.\s*\n", re.IGNORECASE)
+_NSLOOKUP_HOST_RE = re.compile(r"^[^\s]+\s*\n\s*(.+?)\.\s*\n", re.MULTILINE)
+
+# 设备类型关键词，按顺序匹配，优先级：OS > 主机名 > 厂商
+_DEVICE_TYPE_KEYWORDS = {
+    "computer": ["Windows", "Linux", "macOS", "Ubuntu", "Debian", "Fedora", "CentOS", "Red Hat", "Arch Linux"],
+    "mobile": ["Android", "iOS", "iPhone", "iPad", "iPod", "Galaxy", "Pixel", "Nexus"],
+    "iot": ["IoT", "Smart", "Embedded", "Home", "Smart Home", "Smart Speaker", "Smart TV", "Smart Watch"],
+    "camera": ["Camera", "IP Camera", "Webcam", "Security Camera", "Surveillance"],
+    "printer": ["Printer", "Print Server"],
+    "router": ["Router", "Gateway", "Modem", "Access Point", "Wireless"],
+    "switch": ["Switch", "Network Switch", "Ethernet Switch"]
+}
+
+# 每种设备类型的关键词合并为一个不区分大小写的多选正则，一次扫描即可判断是否命中任一关键词
+_DEVICE_TYPE_PATTERNS = tuple(
+    (device_type, re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE))
+    for device_type, keywords in _DEVICE_TYPE_KEYWORDS.items()
+)
+
+# 扫描时会更新的设备字段，任一字段变化时才需要写回数据库（last_seen每次扫描都会变，不单独触发写入）
+_SCAN_FIELDS = ("ip_address", "status", "hostname", "device_type", "manufacturer", "os")
+
+# 加载设备时每批从游标读取的行数，避免一次性把整张表读入内存
+_LOAD_BATCH_SIZE = 1000
+
+# 数据库中表示空容器的JSON文本，加载时直接创建空容器而不必解析
+_EMPTY_JSON = frozenset(("", "{}", "[]"))
+
+# 从数据库加载的设备流量统计初始值，每个设备复制一份
+_EMPTY_TRAFFIC_STATS = MappingProxyType({"bytes_in": 0, "bytes_out": 0, "packets_in": 0, "packets_out": 0})
+
+# 设备行为更新的合并写入间隔（秒）
+_FLUSH_INTERVAL_SECONDS = 0.5
+
+# 分组和漏洞列表字段的分隔符，分组ID和CVE编号中不会出现
+_LIST_DELIMITER = "|"
+
+# 建立二级索引的设备字段，get_devices 按这些字段过滤时无需遍历全部设备
+_INDEXED_FIELDS = ("status", "device_type", "manufacturer")
+
+# get_devices_sql 允许过滤的列
+_SQL_FILTER_COLUMNS = frozenset(("mac_address", "ip_address", "hostname", "device_type", "manufacturer", "model",
+                                 "os", "status"))
+
+# MAC地址前三位(OUI)对应厂商，每个OUI只保留一条
+_OUI_NAMES = {
+    # 虚拟设备
+    "00:0C:29": "VMware",
+    "00:50:56": "VMware",
+    "08:00:27": "Oracle VirtualBox",
+    "52:54:00": "QEMU/KVM",
+    "FC:AA:14": "Raspberry Pi",
+    
+    # 主流厂商
+    "00:18:E7": "Apple",
+    "00:1C:42": "Apple",
+    "18:5E:0F": "Apple",
+    "2C:F0:5D": "Apple",
+    "AC:BC:32": "Apple",
+    "F0:18:98": "Apple",
+    "00:09:6B": "Dell",
+    "00:11:22": "Dell",
+    "00:14:22": "Dell",
+    "00:15:C5": "Dell",
+    "00:19:B9": "Dell",
+    "00:1B:21": "Dell",
+    "00:22:48": "Dell",
+    "3C:52:82": "Dell",
+    "44:8A:5B": "Dell",
+    "58:20:B1": "Dell",
+    "78:2B:CB": "Dell",
+    "00:0D:3A": "HP",
+    "00:17:A4": "HP",
+    "00:1A:4B": "HP",
+    "00:1E:0B": "HP",
+    "00:24:81": "HP",
+    "00:25:B3": "HP",
+    "00:30:48": "HP",
+    "08:62:66": "HP",
+    "10:1F:74": "HP",
+    "18:67:B0": "HP",
+    "28:80:88": "HP",
+    "38:BA:F8": "HP",
+    "48:F8:B3": "HP",
+    "5C:B9:01": "HP",
+    "6C:B3:11": "HP",
+    "B8:CA:3A": "HP",
+    "00:23:15": "Lenovo",
+    "00:25:64": "Lenovo",
+    "00:26:18": "Lenovo",
+    "00:27:10": "Lenovo",
+    "34:97:F6": "Lenovo",
+    "48:51:B7": "Lenovo",
+    "5C:B1:3E": "Lenovo",
+    "7C:D1:C3": "Lenovo",
+    "AC:81:12": "Lenovo",
+    "B0:5A:DA": "Lenovo",
+    "D0:50:99": "Lenovo",
+    "EC:F4:BB": "Lenovo",
+    "00:1A:6B": "ASUS",
+    "00:1E:8C": "ASUS",
+    "30:5A:3A": "ASUS",
+    "40:8D:5C": "ASUS",
+    "50:46:5D": "ASUS",
+    "5C:F3:FC": "ASUS",
+    "70:85:C2": "ASUS",
+    "74:2F:68": "ASUS",
+    "78:45:C4": "ASUS",
+    "8C:7B:9D": "ASUS",
+    "9C:B6:54": "ASUS",
+    "AC:22:0B": "ASUS",
+    "BC:5F:F4": "ASUS",
+    "CC:46:D6": "ASUS",
+    "DC:FB:48": "ASUS",
+    "E0:CB:4E": "ASUS",
+    "FC:34:97": "ASUS",
+    "00:16:EA": "Samsung",
+    "00:23:A3": "Samsung",
+    "00:24:1D": "Samsung",
+    "00:2B:67": "Samsung",
+    "00:30:67": "Samsung",
+    "00:31:92": "Samsung",
+    "00:40:5C": "Samsung",
+    "08:30:6B": "Samsung",
+    "10:6F:3F": "Samsung",
+    "14:C2:CC": "Samsung",
+    "18:65:90": "Samsung",
+    "20:79:18": "Samsung",
+    "28:39:26": "Samsung",
+    "30:B4:9E": "Samsung",
+    "34:E8:94": "Samsung",
+    "38:2C:4A": "Samsung",
+    "40:0E:85": "Samsung",
+    "5C:3A:45": "Samsung",
+    "5C:F8:A1": "Samsung",
+    "7C:5C:F8": "Samsung",
+    "88:B1:11": "Samsung",
+    "90:E7:C4": "Samsung",
+    "A0:99:9B": "Samsung",
+    "B4:B5:2F": "Samsung",
+    "C0:18:85": "Samsung",
+    "C4:8E:8F": "Samsung",
+    "C8:3A:35": "Samsung",
+    "D0:21:F9": "Samsung",
+    "D4:6E:0E": "Samsung",
+    "DC:53:60": "Samsung",
+    "E0:94:67": "Samsung",
+    "E8:04:62": "Samsung",
+    "F8:B1:56": "Samsung",
+    "00:25:9C": "Microsoft",
+    "00:50:F2": "Microsoft",
+    "00:90:4B": "Microsoft",
+    "5C:51:88": "Microsoft",
+    "70:77:81": "Microsoft",
+    "D8:BB:C1": "Microsoft",
+    "D8:F2:CA": "Microsoft",
+    "B8:27:EB": "Raspberry Pi",
+    "DC:A6:32": "Raspberry Pi",
+    "E4:5F:01": "Raspberry Pi",
+    "00:16:3E": "Google",
+    "00:1A:11": "Google",
+    "00:21:F6": "Google",
+    "00:23:12": "Google",
+    "00:25:90": "Google",
+    "00:40:96": "Google",
+    "00:40:9D": "Google",
+    "00:50:C2": "Google",
+    "00:A0:C9": "Intel",
+    "00:1C:C0": "Intel",
+    "00:1E:67": "Intel",
+    "00:1F:29": "Intel",
+    "00:21:9B": "Intel",
+    "00:22:41": "Intel",
+    "00:23:45": "Intel",
+    "00:24:7E": "Intel",
+    "00:26:B9": "Intel",
+    "00:27:0E": "Intel",
+    "00:60:6E": "Intel",
+    "00:E0:4C": "Realtek",
+    "00:00:00": "Unknown"
+}
+
+# OUI按24位整数建立的只读查找表，查找时用整数哈希代替字符串切片和大小写转换
+_OUI_MAP = MappingProxyType({int(oui.replace(":", ""), 16): name for oui, name in _OUI_NAMES.items()})
+
+# 固定的SQL文本，在长连接上重复执行同一字符串时可以命中sqlite3的预编译语句缓存
+_SELECT_ALL_SQL = "SELECT * FROM devices"
+_INSERT_GROUP_SQL = "INSERT OR IGNORE INTO device_groups VALUES (?, ?, ?, ?)"
+
+# 设备表的写入语句，单条保存和批量保存共用
+_UPSERT_SQL = """
+    INSERT OR REPLACE INTO devices 
+    (mac_address, ip_address, hostname, device_type, manufacturer, model, os, status, 
+     first_seen, last_seen, behavior_baseline, vulnerabilities, groups) 
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 只有状态变化的设备（如离线）只更新状态列，省去JSON序列化和整行写入
+_UPDATE_STATUS_SQL = "UPDATE devices SET status = ? WHERE mac_address = ?"
+_STATUS_COLUMN = 7  # status 在 _UPSERT_SQL 行中的位置
+
+def _ipv4_to_int(ip_address: str) -> Optional[int]:
+    """将点分十进制IPv4地址转换为整数
+    
+    Args:
+        ip_address: IP地址
+        
+    Returns:
+        地址对应的整数；无法解析时返回None，inet_aton 接受的简写形式（如 "10.1"）也视为无效
+    """
+    if ip_address.count(".") != 3:
+        return None
+    try:
+        return struct.unpack("!I", socket.inet_aton(ip_address))[0]
+    except OSError:
+        return None
+
+def _is_special_ipv4(n: int) -> bool:
+    """判断整数形式的IPv4地址是否为广播地址、多播地址或网络地址"""
+    return ((n & 0xF0000000) == 0xE0000000  # 多播地址 224.0.0.0/4
+            or (n & 0xFF) in (0, 255))  # 网络地址和广播地址（含 255.255.255.255）
+
+@functools.lru_cache(maxsize=4096)
+def _is_bogus_ip(ip_address: str) -> bool:
+    """判断是否为不对应具体设备的IPv4地址：广播地址、多播地址、网络地址
+    
+    Args:
+        ip_address: 点分十进制IPv4地址
+        
+    Returns:
+        是否应跳过该地址；无法解析的地址返回False，由调用方自行处理
+    """
+    n = _ipv4_to_int(ip_address)
+    return n is not None and _is_special_ipv4(n)
+
+@functools.lru_cache(maxsize=4096)
+def _is_device_ip(ip_address: str) -> bool:
+    """判断是否为可对应具体设备的有效IPv4地址
+    
+    Args:
+        ip_address: IP地址
+        
+    Returns:
+        地址可以解析且不是广播地址、多播地址或网络地址时返回True
+    """
+    n = _ipv4_to_int(ip_address)
+    return n is not None and not _is_special_ipv4(n)
+
+def _load_json_field(text: Optional[str], empty: type):
+    """解析数据库中的JSON字段，空值和空容器直接返回新的空容器
+    
+    Args:
+        text: JSON文本
+        empty: 空容器类型，dict或list
+        
+    Returns:
+        解析结果
+    """
+    if text is None or text in _EMPTY_JSON:
+        return empty()
+    return json_loads(text)
+
+def _load_list_field(text: Optional[str]) -> List[str]:
+    """解析数据库中以分隔符连接的字符串列表字段
+    
+    Args:
+        text: 字段文本，旧版本写入的JSON数组同样支持
+        
+    Returns:
+        字符串列表
+    """
+    if not text:
+        return []
+    if text[0] == "[":
+        return _load_json_field(text, list)
+    # 分组ID等在设备间重复，驻留以共享字符串对象
+    return list(map(sys.intern, text.split(_LIST_DELIMITER)))
+
+def _intern_text(value: Optional[str]) -> Optional[str]:
+    """驻留取值重复度高的字符串字段，空值原样返回
+    
+    Args:
+        value: 字段值
+        
+    Returns:
+        驻留后的字符串
+    """
+    return sys.intern(value) if isinstance(value, str) else value
 
 class Device:
     """设备类，代表一个网络设备"""
     
+    # 设备数量可能很多，使用 __slots__ 省去每个实例的 __dict__；顺序即 to_dict 的键顺序
+    __slots__ = ("mac_address", "ip_address", "hostname", "device_type", "manufacturer", "model", "os", "status",
+                 "first_seen", "last_seen", "traffic_stats", "behavior_baseline", "vulnerabilities", "groups")
+    
     def __init__(self, mac_address: str, ip_address: str = ""):
         """初始化设备
         
@@ -41,28 +381,41 @@ class Device:
         self.vulnerabilities = []  # 已知漏洞
         self.groups = []  # 所属分组
     
+    @classmethod
+    def from_row(cls, row: Tuple) -> "Device":
+        """从数据库行构建设备，跳过 __init__ 中随即被覆盖的默认值和时间戳获取
+        
+        Args:
+            row: devices 表的一行，列顺序与 _UPSERT_SQL 一致
+            
+        Returns:
+            设备对象
+        """
+        device = cls.__new__(cls)
+        (device.mac_address, device.ip_address, device.hostname, device.first_seen,
+         device.last_seen) = row[0], row[1], row[2], row[8], row[9]
+        # 类型、厂商、型号、系统、状态的取值在设备间大量重复，驻留后所有设备共享同一个字符串对象
+        device.device_type = _intern_text(row[3])
+        device.manufacturer = _intern_text(row[4])
+        device.model = _intern_text(row[5])
+        device.os = _intern_text(row[6])
+        device.status = _intern_text(row[7])
+        device.traffic_stats = dict(_EMPTY_TRAFFIC_STATS)
+        device.behavior_baseline = _load_json_field(row[10], dict)
+        device.vulnerabilities = _load_list_field(row[11])
+        device.groups = _load_list_field(row[12])
+        return device
+    
     def to_dict(self) -> Dict:
         """转换为字典
         
         Returns:
             设备信息字典
         """
-        return {
-            "mac_address": self.mac_address,
-            "ip_address": self.ip_address,
-            "hostname": self.hostname,
-            "device_type": self.device_type,
-            "manufacturer": self.manufacturer,
-            "model": self.model,
-            "os": self.os,
-            "status": self.status,
-            "first_seen": self.first_seen,
-            "last_seen": self.last_seen,
-            "traffic_stats": self.traffic_stats,
-            "behavior_baseline": self.behavior_baseline,
-            "vulnerabilities": self.vulnerabilities,
-            "groups": self.groups
-        }
+        return dict(zip(Device.__slots__, _DEVICE_GETTER(self)))
+
+# 一次取出设备的全部字段
+_DEVICE_GETTER = operator.attrgetter(*Device.__slots__)
 
 class DeviceManager:
     """设备管理类，负责设备发现、识别和管理"""
@@ -75,26 +428,71 @@ class DeviceManager:
         """
         self.config = config
         self.devices: Dict[str, Device] = {}  # MAC地址 -> Device对象
+        # 二级索引：字段 -> 字段值 -> MAC地址集合，索引字段需通过设备管理器修改以保持同步
+        self._indexes: Dict[str, Dict[str, Set[str]]] = {field: defaultdict(set) for field in _INDEXED_FIELDS}
+        self._group_index: Dict[str, Set[str]] = defaultdict(set)  # 分组ID -> MAC地址集合
+        self._last_persisted: Dict[str, Tuple] = {}  # MAC地址 -> 最近一次写入数据库的行，用于跳过无变化的写入，由 _db_lock 保护
         self.db_path = config.get("device_manager.device_db_path", "../../data/devices.db")
         self.scan_interval = config.get("device_manager.scan_interval_seconds", 300)
         self.unknown_device_alert = config.get("device_manager.unknown_device_alert", True)
         self.main_router_ip = config.get("device_manager.main_router_ip", "")
         self.include_local_machine = config.get("device_manager.include_local_machine", False)
+        self.identify_workers = max(1, int(config.get("device_manager.identify_workers", 16)))
+        self.db_snapshot_interval = float(config.get("device_manager.db_snapshot_interval_seconds", 0))
         
         # 获取本机IP和MAC地址
         self.local_ips, self.local_macs = self._get_local_addresses()
         
+        # 外部识别工具是否可用只在启动时检查一次
+        self._nmap_available = shutil.which("nmap") is not None
+        self._nslookup_available = shutil.which("nslookup") is not None
+        
+        # 数据库长连接，所有读写共享并由锁串行化
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # 启用内存数据库时指向磁盘文件的连接，仅用于载入和写回快照
+        self._disk_conn: Optional[sqlite3.Connection] = None
+        
+        # 行为更新只修改内存并登记MAC，由写入线程定期合并写入
+        self._pending: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._flush_stop = threading.Event()
+        
         # 初始化数据库
         self._init_database()
         
         # 加载设备数据
         self._load_devices()
+        
+        # 启动合并写入线程
+        self._flush_thread = threading.Thread(target=self._flush_pending_loop, daemon=True)
+        self._flush_thread.start()
     
     def _init_database(self) -> None:
-        """初始化数据库"""
+        """初始化数据库，并建立长连接供后续读写复用
+        
+        配置了快照间隔时，读写都在内存数据库中进行：启动时从磁盘文件载入，
+        之后由写入线程定期写回，停止时再写回一次。
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if self.db_snapshot_interval > 0:
+                self._disk_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._disk_conn.execute("PRAGMA journal_mode=WAL")
+                self._disk_conn.execute("PRAGMA busy_timeout=5000")
+                self._conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None,
+                                             cached_statements=256)
+                self._disk_conn.backup(self._conn)
+            else:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                                             cached_statements=256)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn.execute("PRAGMA cache_size=-20000")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            
+            # 构造期间只有当前线程使用连接，无需加锁
+            cursor = self._conn.cursor()
             
             # 创建设备表
             cursor.execute("""
@@ -125,11 +523,13 @@ class DeviceManager:
                 )
             """)
             
+            # 按状态和类型过滤的索引，供 get_devices_sql 分页查询使用
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_status ON devices(status)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_type ON devices(device_type)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_status_type ON devices(status, device_type)")
+            
             # 创建默认分组
             self._create_default_groups(cursor)
-            
-            conn.commit()
-            conn.close()
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
     
@@ -144,54 +544,40 @@ class DeviceManager:
             ("guest", "访客设备", "临时接入的设备", get_current_timestamp())
         ]
         
-        cursor.executemany(
-            "INSERT OR IGNORE INTO device_groups VALUES (?, ?, ?, ?)",
-            default_groups
-        )
+        cursor.executemany(_INSERT_GROUP_SQL, default_groups)
     
     def _load_devices(self) -> None:
         """从数据库加载设备数据"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM devices")
-            rows = cursor.fetchall()
-            
-            for row in rows:
-                mac_address = row[0]
-                ip_address = row[1]
-                
+            for row in self._iter_rows(_SELECT_ALL_SQL):
                 # 跳过广播地址、多播地址和网络地址
-                if (ip_address == "255.255.255.255" or  # 广播地址
-                    ip_address.startswith("224.") or  # 多播地址
-                    ip_address.startswith("239.") or  # 多播地址
-                    ip_address.endswith(".0") or  # 网络地址
-                    ip_address.endswith(".255")):  # 广播地址
+                if _is_bogus_ip(row[1]):
                     continue
                 
-                device = Device(mac_address, ip_address)
-                device.hostname = row[2]
-                device.device_type = row[3]
-                device.manufacturer = row[4]
-                device.model = row[5]
-                device.os = row[6]
-                device.status = row[7]
-                device.first_seen = row[8]
-                device.last_seen = row[9]
-                
-                # 解析JSON字段
-                import json
-                device.behavior_baseline = json.loads(row[10] if row[10] else "{}")
-                device.vulnerabilities = json.loads(row[11] if row[11] else "[]")
-                device.groups = json.loads(row[12] if row[12] else "[]")
-                
+                device = Device.from_row(row)
                 self.devices[device.mac_address] = device
-            
-            conn.close()
+                self._index_device(device)
+                self._last_persisted[device.mac_address] = tuple(row[:13])
         except Exception as e:
             logger.error(f"Error loading devices from database: {e}")
     
+    def _iter_rows(self, sql: str) -> Iterator[Tuple]:
+        """分批读取查询结果
+        
+        Args:
+            sql: 查询语句
+            
+        Returns:
+            结果行迭代器
+        """
+        with self._db_lock:
+            cursor = self._conn.execute(sql)
+            cursor.arraysize = _LOAD_BATCH_SIZE
+            rows = cursor.fetchmany()
+            while rows:
+                yield from rows
+                rows = cursor.fetchmany()
+    
     def scan_devices(self) -> List[Device]:
         """扫描网络设备
         
@@ -200,31 +586,32 @@ class DeviceManager:
         """
         logger.info("Scanning network devices...")
         
-        # 使用arp命令扫描设备
         try:
-            # 在Windows上使用arp命令，添加超时处理
-            result = subprocess.run(
-                ["arp", "-a"],
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10  # 添加10秒超时
-            )
-            
-            if result.returncode != 0:
-                logger.error(f"Error running arp scan: {result.stderr}")
-                return []
-            
-            devices = self._parse_arp_output(result.stdout)
+            entries = self._read_arp_table()
+            if entries is not None:
+                devices = self._build_devices(entries)
+            else:
+                # 无法直接读取ARP缓存的系统使用arp命令，添加超时处理
+                # 输出保持为字节串直接匹配，省去整段解码
+                result = subprocess.run(
+                    ["arp", "-a"],
+                    capture_output=True,
+                    timeout=10  # 添加10秒超时
+                )
+                
+                if result.returncode != 0:
+                    logger.error(f"Error running arp scan: {result.stderr.decode(errors='replace')}")
+                    return []
+                
+                devices = self._parse_arp_output(result.stdout)
             
-            # 对每个设备进行更详细的识别，使用异步方式避免阻塞
-            for device in devices:
-                try:
-                    self._identify_device(device)
-                except Exception as e:
-                    logger.error(f"Error identifying device {device.mac_address}: {e}")
-                    # 即使识别失败，也继续处理其他设备
-                    continue
+            # 对每个设备进行更详细的识别：nmap一次扫描全部设备，由其内部并行处理各主机；
+            # nslookup是外部进程，多线程并行等待，每个线程只修改自己负责的设备对象
+            if devices:
+                nmap_results = self._batch_nmap([device.ip_address for device in devices])
+                nmap_infos = [nmap_results.get(device.ip_address, {}) for device in devices]
+                with ThreadPoolExecutor(max_workers=min(self.identify_workers, len(devices))) as executor:
+                    list(executor.map(self._identify_device_safe, devices, nmap_infos))
                 
             # 更新设备状态
             self._update_device_status(devices)
@@ -246,10 +633,6 @@ class DeviceManager:
         Returns:
             (local_ips, local_macs) - 本机IP地址列表和MAC地址列表
         """
-        import socket
-        import subprocess
-        import re
-        
         local_ips = []
         local_macs = []
         
@@ -270,8 +653,7 @@ class DeviceManager:
                 )
                 
                 # 解析MAC地址
-                mac_pattern = r"Physical Address.*?: ([0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2})"
-                mac_matches = re.findall(mac_pattern, result.stdout)
+                mac_matches = _MAC_WIN_RE.findall(result.stdout)
                 local_macs = [mac.replace("-", ":").lower() for mac in mac_matches]
             else:
                 # Linux/macOS系统使用ifconfig或ip命令
@@ -282,8 +664,7 @@ class DeviceManager:
                 )
                 
                 # 解析MAC地址
-                mac_pattern = r"ether ([0-9a-f:]{17})"
-                mac_matches = re.findall(mac_pattern, result.stdout)
+                mac_matches = _MAC_UNIX_RE.findall(result.stdout)
                 local_macs = [mac.lower() for mac in mac_matches]
                 
         except Exception as e:
@@ -291,47 +672,161 @@ class DeviceManager:
         
         return local_ips, local_macs
     
-    def _parse_arp_output(self, output: str) -> List[Device]:
+    def _parse_arp_output(self, output: bytes) -> List[Device]:
         """解析arp命令输出
         
         Args:
-            output: arp命令输出
+            output: arp命令的原始字节输出
             
         Returns:
             设备列表
         """
-        devices = []
-        seen_macs = set()  # 用于去重
+        return self._build_devices(self._iter_arp_output(output))
+    
+    @staticmethod
+    def _iter_arp_output(output: bytes) -> Iterator[Tuple[str, str]]:
+        """按列拆分arp命令输出，取出每行的IP地址和MAC地址
+        
+        支持多种ARP输出格式，每行前两列依次为IP地址和MAC地址，其余列忽略：
+        格式1: IP地址 物理地址 类型
+        格式2: IP地址          MAC地址
+        IP地址由 _build_devices 用 inet_aton 校验，这里只检查MAC地址的形状。
+        
+        Args:
+            output: arp命令的原始字节输出
+            
+        Returns:
+            (IP地址, MAC地址) 迭代器
+        """
+        for fields in map(bytes.split, output.splitlines()):
+            if len(fields) < 2:
+                continue
+            
+            # MAC地址为17个字符，分隔符统一为 ":" 或 "-" 且位于固定位置，其余都是十六进制字符
+            mac_address = fields[1]
+            separator = mac_address[2:3]
+            if (len(mac_address) != 17 or separator not in (b":", b"-")
+                    or mac_address[2::3] != separator * 5 or mac_address.translate(None, _MAC_CHARS)):
+                continue
+            
+            # IP列中的非ASCII字符被替换，此类地址会在 _build_devices 校验时被过滤
+            yield fields[0].decode("ascii", "replace"), mac_address.decode("ascii")
+    
+    def _read_arp_table(self) -> Optional[List[Tuple[str, str]]]:
+        """不启动子进程，直接读取系统ARP缓存
         
-        # 匹配MAC地址和IP地址的正则表达式（优化版，支持多种ARP输出格式）
-        # 格式1: IP地址 物理地址 类型
-        # 格式2: IP地址          MAC地址
-        # 支持多种分隔符：空格、制表符等
-        pattern = r'([0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3})\s+([0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2}[:-][0-9A-Fa-f]{2})'
+        Returns:
+            (IP地址, MAC地址) 列表；当前系统不支持或读取失败时返回None
+        """
+        if os.path.exists(_PROC_NET_ARP):
+            # Linux上直接读取内核ARP缓存
+            return list(self._read_proc_net_arp())
+        
+        if sys.platform == "win32":
+            # Windows上调用IP Helper API
+            try:
+                return list(self._read_ip_net_table())
+            except OSError as e:
+                logger.debug(f"GetIpNetTable failed, falling back to arp command: {e}")
+        return None
+    
+    @staticmethod
+    def _read_ip_net_table() -> Iterator[Tuple[str, str]]:
+        """通过 GetIpNetTable 读取Windows ARP缓存
         
-        matches = re.finditer(pattern, output, re.IGNORECASE)
+        Returns:
+            (IP地址, MAC地址) 迭代器
+        """
+        get_ip_net_table = ctypes.windll.iphlpapi.GetIpNetTable
+        size = ctypes.c_ulong(0)
+        buffer = None
+        
+        # 两次调用之间表可能变大，缓冲区不足时按返回的大小重试
+        for _ in range(3):
+            ret = get_ip_net_table(buffer, ctypes.byref(size), False)
+            if ret == 0:
+                break
+            if ret == _ERROR_NO_DATA:
+                return iter(())
+            if ret != _ERROR_INSUFFICIENT_BUFFER:
+                raise OSError(ret, "GetIpNetTable failed")
+            buffer = ctypes.create_string_buffer(size.value)
+        else:
+            raise OSError(_ERROR_INSUFFICIENT_BUFFER, "GetIpNetTable buffer kept growing")
+        
+        if buffer is None:
+            return iter(())
+        return DeviceManager._parse_ip_net_table(buffer)
+    
+    @staticmethod
+    def _parse_ip_net_table(buffer) -> Iterator[Tuple[str, str]]:
+        """解析 GetIpNetTable 返回的 MIB_IPNETTABLE 结构
+        
+        结构开头是表项数量（DWORD），之后紧跟相应数量的 MIB_IPNETROW。
+        
+        Args:
+            buffer: 可写的ctypes缓冲区
+            
+        Returns:
+            (IP地址, MAC地址) 迭代器
+        """
+        count = ctypes.c_uint32.from_buffer(buffer).value
+        rows = (_MibIpNetRow * count).from_buffer(buffer, ctypes.sizeof(ctypes.c_uint32))
+        for row in rows:
+            if row.dwType == _MIB_IPNET_TYPE_INVALID or row.dwPhysAddrLen != 6:
+                continue
+            
+            # dwAddr 按网络字节序存放，按本机字节序取出的整数再按本机字节序写回即得到原始地址字节
+            ip_address = socket.inet_ntoa(struct.pack("=I", row.dwAddr))
+            yield ip_address, ":".join(f"{octet:02x}" for octet in row.bPhysAddr[:6])
+    
+    @staticmethod
+    def _read_proc_net_arp(path: str = _PROC_NET_ARP) -> Iterator[Tuple[str, str]]:
+        """读取Linux内核ARP缓存
+        
+        文件第一行是表头，之后每行依次为 IP地址、硬件类型、标志、MAC地址、掩码、网络接口。
+        
+        Args:
+            path: ARP缓存文件路径
+            
+        Returns:
+            (IP地址, MAC地址) 迭代器
+        """
+        with open(path, "r") as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 4:
+                    yield fields[0], fields[3]
+    
+    def _build_devices(self, entries: Iterable[Tuple[str, str]]) -> List[Device]:
+        """根据ARP表项创建设备，过滤无效、重复、广播/多播和本机地址
+        
+        Args:
+            entries: (IP地址, MAC地址) 序列
+            
+        Returns:
+            设备列表
+        """
+        devices = []
+        seen_macs = set()  # 用于去重
         
-        for match in matches:
-            ip_address = match.group(1)
-            mac_address = match.group(2).replace("-", ":").lower()
+        for ip_address, mac_address in entries:
+            mac_address = mac_address.replace("-", ":").lower()
             
             # 跳过无效MAC地址
             if mac_address == "00:00:00:00:00:00" or mac_address == "ff:ff:ff:ff:ff:ff":
                 continue
             
+            # 跳过无效的IP地址，以及广播地址、多播地址和网络地址；先于去重，避免无效表项占用MAC
+            if not _is_device_ip(ip_address):
+                continue
+            
             # 跳过重复设备
             if mac_address in seen_macs:
                 continue
             seen_macs.add(mac_address)
             
-            # 跳过广播地址、多播地址和网络地址
-            if (ip_address == "255.255.255.255" or  # 广播地址
-                ip_address.startswith("224.") or  # 多播地址
-                ip_address.startswith("239.") or  # 多播地址
-                ip_address.endswith(".0") or  # 网络地址
-                ip_address.endswith(".255")):  # 广播地址
-                continue
-            
             # 跳过本机设备（如果配置了不包含）
             if not self.include_local_machine:
                 if ip_address in self.local_ips or mac_address in self.local_macs:
@@ -349,11 +844,24 @@ class DeviceManager:
         
         return devices
     
-    def _identify_device(self, device: Device) -> None:
+    def _identify_device_safe(self, device: Device, nmap_info: Optional[Dict[str, str]] = None) -> None:
+        """识别设备信息，出错时只记录日志，不影响其他设备的识别
+        
+        Args:
+            device: 设备对象
+            nmap_info: 批量nmap扫描得到的该设备信息
+        """
+        try:
+            self._identify_device(device, nmap_info)
+        except Exception as e:
+            logger.error(f"Error identifying device {device.mac_address}: {e}")
+    
+    def _identify_device(self, device: Device, nmap_info: Optional[Dict[str, str]] = None) -> None:
         """识别设备信息
         
         Args:
             device: 设备对象
+            nmap_info: 批量nmap扫描得到的该设备信息，为None时单独扫描该设备
         """
         # 1. 根据MAC地址识别厂商
         self._identify_manufacturer(device)
@@ -362,7 +870,9 @@ class DeviceManager:
         self._dns_reverse_lookup(device)
         
         # 3. 使用nmap进行更详细的设备识别
-        self._nmap_device_scan(device)
+        if nmap_info is None:
+            nmap_info = self._batch_nmap([device.ip_address]).get(device.ip_address, {})
+        self._apply_nmap_info(device, nmap_info)
         
         # 4. 根据设备特征推断设备类型
         self._infer_device_type(device)
@@ -377,234 +887,91 @@ class DeviceManager:
             device: 设备对象
         """
         # MAC地址前三位(OUI)对应厂商
-        oui = device.mac_address[:8].upper()
-        
-        # 扩展厂商映射表
-        oui_map = {
-            # 虚拟设备
-            "00:0C:29": "VMware",
-            "00:50:56": "VMware",
-            "08:00:27": "Oracle VirtualBox",
-            "52:54:00": "QEMU/KVM",
-            "FC:AA:14": "Raspberry Pi",
-            
-            # 主流厂商
-            "00:18:E7": "Apple",
-            "00:1C:42": "Apple",
-            "18:5E:0F": "Apple",
-            "2C:F0:5D": "Apple",
-            "AC:BC:32": "Apple",
-            "F0:18:98": "Apple",
-            "00:09:6B": "Dell",
-            "00:11:22": "Dell",
-            "00:14:22": "Dell",
-            "00:15:C5": "Dell",
-            "00:19:B9": "Dell",
-            "00:1B:21": "Dell",
-            "00:22:48": "Dell",
-            "00:50:56": "Dell",
-            "3C:52:82": "Dell",
-            "44:8A:5B": "Dell",
-            "58:20:B1": "Dell",
-            "78:2B:CB": "Dell",
-            "00:0D:3A": "HP",
-            "00:17:A4": "HP",
-            "00:1A:4B": "HP",
-            "00:1E:0B": "HP",
-            "00:24:81": "HP",
-            "00:25:B3": "HP",
-            "00:30:48": "HP",
-            "08:62:66": "HP",
-            "10:1F:74": "HP",
-            "18:67:B0": "HP",
-            "28:80:88": "HP",
-            "38:BA:F8": "HP",
-            "48:F8:B3": "HP",
-            "5C:B9:01": "HP",
-            "6C:B3:11": "HP",
-            "B8:CA:3A": "HP",
-            "00:23:15": "Lenovo",
-            "00:25:64": "Lenovo",
-            "00:26:18": "Lenovo",
-            "00:27:10": "Lenovo",
-            "00:50:56": "Lenovo",
-            "34:97:F6": "Lenovo",
-            "48:51:B7": "Lenovo",
-            "5C:B1:3E": "Lenovo",
-            "7C:D1:C3": "Lenovo",
-            "AC:81:12": "Lenovo",
-            "B0:5A:DA": "Lenovo",
-            "D0:50:99": "Lenovo",
-            "EC:F4:BB": "Lenovo",
-            "00:1A:6B": "ASUS",
-            "00:1E:8C": "ASUS",
-            "00:24:81": "ASUS",
-            "08:62:66": "ASUS",
-            "10:1F:74": "ASUS",
-            "18:67:B0": "ASUS",
-            "28:80:88": "ASUS",
-            "30:5A:3A": "ASUS",
-            "40:8D:5C": "ASUS",
-            "50:46:5D": "ASUS",
-            "5C:F3:FC": "ASUS",
-            "70:85:C2": "ASUS",
-            "74:2F:68": "ASUS",
-            "78:45:C4": "ASUS",
-            "8C:7B:9D": "ASUS",
-            "9C:B6:54": "ASUS",
-            "AC:22:0B": "ASUS",
-            "BC:5F:F4": "ASUS",
-            "CC:46:D6": "ASUS",
-            "DC:FB:48": "ASUS",
-            "E0:CB:4E": "ASUS",
-            "FC:34:97": "ASUS",
-            "00:16:EA": "Samsung",
-            "00:23:A3": "Samsung",
-            "00:24:1D": "Samsung",
-            "00:25:64": "Samsung",
-            "00:26:18": "Samsung",
-            "00:27:10": "Samsung",
-            "00:2B:67": "Samsung",
-            "00:30:67": "Samsung",
-            "00:31:92": "Samsung",
-            "00:40:5C": "Samsung",
-            "08:30:6B": "Samsung",
-            "10:6F:3F": "Samsung",
-            "14:C2:CC": "Samsung",
-            "18:65:90": "Samsung",
-            "20:79:18": "Samsung",
-            "28:39:26": "Samsung",
-            "30:B4:9E": "Samsung",
-            "34:E8:94": "Samsung",
-            "38:2C:4A": "Samsung",
-            "40:0E:85": "Samsung",
-            "5C:3A:45": "Samsung",
-            "5C:F8:A1": "Samsung",
-            "7C:5C:F8": "Samsung",
-            "88:B1:11": "Samsung",
-            "90:E7:C4": "Samsung",
-            "A0:99:9B": "Samsung",
-            "AC:22:0B": "Samsung",
-            "B4:B5:2F": "Samsung",
-            "C0:18:85": "Samsung",
-            "C4:8E:8F": "Samsung",
-            "C8:3A:35": "Samsung",
-            "D0:21:F9": "Samsung",
-            "D4:6E:0E": "Samsung",
-            "DC:53:60": "Samsung",
-            "E0:94:67": "Samsung",
-            "E8:04:62": "Samsung",
-            "F8:B1:56": "Samsung",
-            "00:25:9C": "Microsoft",
-            "00:50:F2": "Microsoft",
-            "00:90:4B": "Microsoft",
-            "3C:52:82": "Microsoft",
-            "5C:51:88": "Microsoft",
-            "70:77:81": "Microsoft",
-            "D8:BB:C1": "Microsoft",
-            "D8:F2:CA": "Microsoft",
-            "FC:AA:14": "Raspberry Pi",
-            "B8:27:EB": "Raspberry Pi",
-            "DC:A6:32": "Raspberry Pi",
-            "E4:5F:01": "Raspberry Pi",
-            "00:16:3E": "Google",
-            "00:1A:11": "Google",
-            "00:21:F6": "Google",
-            "00:23:12": "Google",
-            "00:24:1D": "Google",
-            "00:25:90": "Google",
-            "00:26:18": "Google",
-            "00:27:10": "Google",
-            "00:30:67": "Google",
-            "00:31:92": "Google",
-            "00:40:5C": "Google",
-            "00:40:96": "Google",
-            "00:40:9D": "Google",
-            "00:50:56": "Google",
-            "00:50:C2": "Google",
-            "00:50:F2": "Google",
-            "00:A0:C9": "Intel",
-            "00:1B:21": "Intel",
-            "00:1C:C0": "Intel",
-            "00:1E:67": "Intel",
-            "00:1F:29": "Intel",
-            "00:21:9B": "Intel",
-            "00:22:41": "Intel",
-            "00:23:45": "Intel",
-            "00:24:7E": "Intel",
-            "00:25:90": "Intel",
-            "00:26:B9": "Intel",
-            "00:27:0E": "Intel",
-            "00:30:67": "Intel",
-            "00:31:92": "Intel",
-            "00:40:96": "Intel",
-            "00:40:9D": "Intel",
-            "00:50:56": "Intel",
-            "00:50:F2": "Intel",
-            "00:60:6E": "Intel",
-            "00:A0:C9": "Intel",
-            "00:E0:4C": "Realtek",
-            "70:85:C2": "Realtek",
-            "00:00:00": "Unknown"
-        }
+        try:
+            oui = int(device.mac_address[:8].replace(":", "", 2), 16)
+        except ValueError:
+            device.manufacturer = "unknown"
+            return
         
-        device.manufacturer = oui_map.get(oui, "unknown")
+        device.manufacturer = _OUI_MAP.get(oui, "unknown")
     
-    def _nmap_device_scan(self, device: Device) -> None:
-        """使用nmap扫描设备详细信息
+    def _batch_nmap(self, ip_addresses: List[str]) -> Dict[str, Dict[str, str]]:
+        """使用一次nmap调用扫描多个设备
         
         Args:
-            device: 设备对象
+            ip_addresses: IP地址列表
+            
+        Returns:
+            IP地址 -> 识别结果（os、device_type、hostname）
         """
+        ip_addresses = [ip_address for ip_address in ip_addresses if ip_address]
+        if not ip_addresses or not self._nmap_available:
+            return {}
+        
         try:
-            # 检查nmap是否可用
-            subprocess.run(
-                ["nmap", "--version"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            # 使用nmap进行OS检测和服务扫描
+            # 使用nmap进行OS检测和服务扫描，XML结果输出到标准输出
             result = subprocess.run(
-                ["nmap", "-O", "-sV", "-T4", device.ip_address],
+                ["nmap", "-O", "-sV", "-T4", "--host-timeout", _NMAP_HOST_TIMEOUT, "-oX", "-", *ip_addresses],
                 capture_output=True,
-                text=True,
-                timeout=10
+                timeout=_NMAP_TIMEOUT_SECONDS
             )
             
             if result.returncode == 0:
-                self._parse_nmap_output(device, result.stdout)
-            else:
-                logger.debug(f"nmap scan returned non-zero exit code for {device.ip_address}: {result.stderr}")
+                return self._parse_nmap_xml(result.stdout)
+            logger.debug(f"nmap scan returned non-zero exit code: {result.stderr.decode(errors='replace')}")
         except FileNotFoundError:
-            logger.debug(f"nmap is not installed, skipping device scan for {device.ip_address}")
+            logger.debug("nmap is not installed, skipping device scan")
         except subprocess.TimeoutExpired:
-            logger.debug(f"nmap scan timed out for {device.ip_address}")
+            logger.debug(f"nmap scan timed out for {len(ip_addresses)} devices")
         except Exception as e:
-            logger.debug(f"Error running nmap scan on {device.ip_address}: {e}")
+            logger.debug(f"Error running nmap scan: {e}")
+        return {}
     
-    def _parse_nmap_output(self, device: Device, output: str) -> None:
-        """解析nmap输出
+    @staticmethod
+    def _parse_nmap_xml(output: bytes) -> Dict[str, Dict[str, str]]:
+        """解析nmap的XML输出
         
         Args:
-            device: 设备对象
-            output: nmap输出
+            output: nmap -oX 输出
+            
+        Returns:
+            IP地址 -> 识别结果（os、device_type、hostname）
         """
-        # 解析OS信息
-        os_match = re.search(r"Running: (.+?)\n", output)
-        if os_match:
-            device.os = os_match.group(1)
-        
-        # 解析设备类型
-        device_type_match = re.search(r"Device type: (.+?)\n", output)
-        if device_type_match:
-            device.device_type = device_type_match.group(1)
+        results = {}
+        for _, elem in ElementTree.iterparse(io.BytesIO(output)):
+            if elem.tag != "host":
+                continue
+            
+            address = elem.find("address[@addrtype='ipv4']")
+            if address is not None:
+                info = {}
+                osmatch = elem.find("os/osmatch")
+                if osmatch is not None:
+                    info["os"] = osmatch.get("name", "")
+                    osclass = osmatch.find("osclass")
+                    if osclass is not None:
+                        info["device_type"] = osclass.get("type", "")
+                hostname = elem.find("hostnames/hostname")
+                if hostname is not None:
+                    info["hostname"] = hostname.get("name", "")
+                results[address.get("addr")] = info
+            
+            # 逐个主机处理完即释放，避免大量主机时整棵树常驻内存
+            elem.clear()
+        return results
+    
+    @staticmethod
+    def _apply_nmap_info(device: Device, nmap_info: Dict[str, str]) -> None:
+        """将nmap识别结果写入设备
         
-        # 解析主机名
-        hostname_match = re.search(r"Hostname: (.+?)\n", output)
-        if hostname_match:
-            device.hostname = hostname_match.group(1)
+        Args:
+            device: 设备对象
+            nmap_info: 识别结果
+        """
+        for field in _NMAP_FIELDS:
+            value = nmap_info.get(field)
+            if value:
+                setattr(device, field, _intern_text(value))
     
     def _dns_reverse_lookup(self, device: Device) -> None:
         """DNS反向查询获取主机名
@@ -612,18 +979,10 @@ class DeviceManager:
         Args:
             device: 设备对象
         """
-        if not device.ip_address:
+        if not device.ip_address or not self._nslookup_available:
             return
         
         try:
-            # 检查nslookup是否可用
-            subprocess.run(
-                ["nslookup", "--version"],
-                capture_output=True,
-                text=True,
-                timeout=3
-            )
-            
             # 使用nslookup进行反向查询
             result = subprocess.run(
                 ["nslookup", device.ip_address],
@@ -635,12 +994,12 @@ class DeviceManager:
             if result.returncode == 0:
                 # 解析反向查询结果（支持多种格式）
                 # 格式1: name = hostname.example.com
-                hostname_match = re.search(r"name\s*=\s*(.+?)\.\s*\n", result.stdout, re.IGNORECASE)
+                hostname_match = _NSLOOKUP_NAME_RE.search(result.stdout)
                 if hostname_match and hostname_match.group(1):
                     device.hostname = hostname_match.group(1)
                 else:
                     # 格式2: hostname.example.com
-                    hostname_match = re.search(r"^[^\s]+\s*\n\s*(.+?)\.\s*\n", result.stdout, re.MULTILINE)
+                    hostname_match = _NSLOOKUP_HOST_RE.search(result.stdout)
                     if hostname_match and hostname_match.group(1):
                         device.hostname = hostname_match.group(1)
         except FileNotFoundError:
@@ -660,25 +1019,14 @@ class DeviceManager:
         if device.device_type != "unknown":
             return
         
-        # 根据设备类型关键词推断，优先级：OS > 主机名 > 厂商
-        type_keywords = {
-            "computer": ["Windows", "Linux", "macOS", "Ubuntu", "Debian", "Fedora", "CentOS", "Red Hat", "Arch Linux"],
-            "mobile": ["Android", "iOS", "iPhone", "iPad", "iPod", "Galaxy", "Pixel", "Nexus"],
-            "iot": ["IoT", "Smart", "Embedded", "Home", "Smart Home", "Smart Speaker", "Smart TV", "Smart Watch"],
-            "camera": ["Camera", "IP Camera", "Webcam", "Security Camera", "Surveillance"],
-            "printer": ["Printer", "Print Server"],
-            "router": ["Router", "Gateway", "Modem", "Access Point", "Wireless"],
-            "switch": ["Switch", "Network Switch", "Ethernet Switch"]
-        }
+        # 三个字段用不会出现在关键词中的分隔符拼接，避免跨字段误匹配
+        haystack = f"{device.os}\x00{device.hostname}\x00{device.manufacturer}"
         
-        # 多轮匹配，确保找到最准确的设备类型
-        for device_type, keywords in type_keywords.items():
-            for keyword in keywords:
-                if keyword in device.os or keyword.lower() in device.os.lower() or \
-                   keyword in device.hostname or keyword.lower() in device.hostname.lower() or \
-                   keyword in device.manufacturer or keyword.lower() in device.manufacturer.lower():
-                    device.device_type = device_type
-                    return
+        # 按类型顺序匹配，确保找到最准确的设备类型
+        for device_type, pattern in _DEVICE_TYPE_PATTERNS:
+            if pattern.search(haystack):
+                device.device_type = device_type
+                return
         
         # 如果还是未知，默认设为computer
         device.device_type = "computer"
@@ -701,12 +1049,15 @@ class DeviceManager:
             discovered_devices: 发现的设备列表
         """
         current_macs = {dev.mac_address for dev in discovered_devices}
+        to_save: List[Device] = []  # 本次需要写入数据库的设备，最后在一个事务中保存
         
         # 更新在线设备
         for dev in discovered_devices:
             if dev.mac_address in self.devices:
                 # 更新现有设备信息
                 existing_dev = self.devices[dev.mac_address]
+                before = tuple(getattr(existing_dev, field) for field in _SCAN_FIELDS)
+                self._unindex_device(existing_dev)
                 existing_dev.ip_address = dev.ip_address
                 existing_dev.status = "online"
                 existing_dev.last_seen = get_current_timestamp()
@@ -714,6 +1065,11 @@ class DeviceManager:
                 existing_dev.device_type = dev.device_type or existing_dev.device_type
                 existing_dev.manufacturer = dev.manufacturer or existing_dev.manufacturer
                 existing_dev.os = dev.os or existing_dev.os
+                self._index_device(existing_dev)
+                
+                # 只有字段实际变化（如重新上线、IP变更）时才写回数据库
+                if tuple(getattr(existing_dev, field) for field in _SCAN_FIELDS) != before:
+                    to_save.append(existing_dev)
             else:
                 # 新设备
                 logger.info(f"New device discovered: {dev.mac_address} ({dev.ip_address})")
@@ -725,19 +1081,48 @@ class DeviceManager:
                 dev.groups.append("all")
                 if dev.device_type in ["computer", "mobile", "iot", "camera"]:
                     dev.groups.append(dev.device_type)
+                self._index_device(dev)
                 
-                # 保存到数据库
-                self._save_device_to_db(dev)
+                # 待保存到数据库
+                to_save.append(dev)
                 
                 # 未知设备告警
                 if self.unknown_device_alert:
                     logger.warning(f"Unknown device detected: {dev.mac_address} ({dev.ip_address})")
         
-        # 更新离线设备
-        for mac, device in self.devices.items():
-            if mac not in current_macs:
-                device.status = "offline"
-                self._save_device_to_db(device)
+        # 更新离线设备，已经离线的设备无需重复写入；离线只改变状态，单独更新状态列
+        went_offline = [device for mac, device in self.devices.items()
+                        if mac not in current_macs and device.status != "offline"]
+        for device in went_offline:
+            self._set_indexed_field(device, "status", "offline")
+        
+        self._save_devices_bulk(to_save, went_offline)
+    
+    @staticmethod
+    def _device_to_row(device: Device) -> Tuple:
+        """将设备转换为数据库行
+        
+        Args:
+            device: 设备对象
+            
+        Returns:
+            与 _UPSERT_SQL 列顺序一致的参数元组
+        """
+        return (
+            device.mac_address,
+            device.ip_address,
+            device.hostname,
+            device.device_type,
+            device.manufacturer,
+            device.model,
+            device.os,
+            device.status,
+            device.first_seen,
+            device.last_seen,
+            json_dumps(device.behavior_baseline),
+            _LIST_DELIMITER.join(device.vulnerabilities),
+            _LIST_DELIMITER.join(device.groups)
+        )
     
     def _save_device_to_db(self, device: Device) -> None:
         """保存设备到数据库
@@ -746,36 +1131,57 @@ class DeviceManager:
             device: 设备对象
         """
         try:
-            import json
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO devices 
-                (mac_address, ip_address, hostname, device_type, manufacturer, model, os, status, 
-                 first_seen, last_seen, behavior_baseline, vulnerabilities, groups) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                device.mac_address,
-                device.ip_address,
-                device.hostname,
-                device.device_type,
-                device.manufacturer,
-                device.model,
-                device.os,
-                device.status,
-                device.first_seen,
-                device.last_seen,
-                json.dumps(device.behavior_baseline),
-                json.dumps(device.vulnerabilities),
-                json.dumps(device.groups)
-            ))
-            
-            conn.commit()
-            conn.close()
+            # 与批量保存相同，比较、写入和更新缓存在同一把锁内完成
+            with self._db_lock:
+                row = self._device_to_row(device)
+                # 与上次写入的内容相同则跳过
+                if self._last_persisted.get(device.mac_address) == row:
+                    return
+                self._conn.execute(_UPSERT_SQL, row)
+                self._last_persisted[device.mac_address] = row
         except Exception as e:
             logger.error(f"Error saving device to database: {e}")
     
+    def _save_devices_bulk(self, devices: List[Device], status_only: List[Device] = ()) -> None:
+        """在一个事务中批量保存设备
+        
+        Args:
+            devices: 需要整行保存的设备对象列表
+            status_only: 只有状态变化、只需更新状态列的设备对象列表
+        """
+        if not devices and not status_only:
+            return
+        
+        try:
+            # 比较、写入和更新缓存在同一把锁内完成：写入线程和扫描线程可能同时保存同一设备，
+            # 分开进行时较慢的一方会用旧行覆盖新行并把旧行记为已写入，之后的保存都会被跳过
+            with self._db_lock:
+                last_persisted = self._last_persisted
+                rows = [row for row in map(self._device_to_row, devices) if last_persisted.get(row[0]) != row]
+                status_rows = [(device.status, device.mac_address) for device in status_only
+                               if device.mac_address not in last_persisted
+                               or last_persisted[device.mac_address][_STATUS_COLUMN] != device.status]
+                if not rows and not status_rows:
+                    return
+                
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if rows:
+                        self._conn.executemany(_UPSERT_SQL, rows)
+                    if status_rows:
+                        self._conn.executemany(_UPDATE_STATUS_SQL, status_rows)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                last_persisted.update((row[0], row) for row in rows)
+                for status, mac_address in status_rows:
+                    row = last_persisted.get(mac_address)
+                    if row is not None:
+                        last_persisted[mac_address] = row[:_STATUS_COLUMN] + (status,) + row[_STATUS_COLUMN + 1:]
+        except Exception as e:
+            logger.error(f"Error saving devices to database: {e}")
+    
     def get_device(self, mac_address: str) -> Optional[Device]:
         """根据MAC地址获取设备
         
@@ -799,8 +1205,18 @@ class DeviceManager:
         if not filters:
             return list(self.devices.values())
         
+        # 有索引字段时先用索引求交集缩小候选范围，从最小的集合开始
+        index_sets = sorted((self._indexes[key].get(value, set()) for key, value in filters.items()
+                             if key in self._indexes), key=len)
+        if index_sets:
+            macs = index_sets[0].intersection(*index_sets[1:])
+            candidates = [self.devices[mac] for mac in macs if mac in self.devices]
+        else:
+            candidates = self.devices.values()
+        
+        # 逐个核对全部过滤条件（包括非索引字段）
         result = []
-        for device in self.devices.values():
+        for device in candidates:
             match = True
             for key, value in filters.items():
                 if getattr(device, key, None) != value:
@@ -811,8 +1227,123 @@ class DeviceManager:
         
         return result
     
+    def get_devices_sql(self, filters: Dict = None, limit: Optional[int] = None, offset: int = 0) -> List[Device]:
+        """在数据库中过滤并分页获取设备，适合设备数量很多时按页展示
+        
+        Args:
+            filters: 过滤条件，如 {"status": "online", "device_type": "iot"}，只支持数据库中的普通列
+            limit: 最多返回的设备数，None表示不限制
+            offset: 跳过的设备数
+            
+        Returns:
+            按MAC地址排序的设备列表
+        """
+        filters = filters or {}
+        unknown = [key for key in filters if key not in _SQL_FILTER_COLUMNS]
+        if unknown:
+            logger.warning(f"Unsupported device filter columns: {unknown}")
+            return []
+        
+        # 先写入内存中尚未落库的修改，保证查询结果与内存一致
+        self.flush()
+        
+        # 列名来自白名单，取值全部使用参数占位符
+        where = " AND ".join(f"{key} = ?" for key in filters)
+        sql = "SELECT mac_address FROM devices"
+        if where:
+            sql += " WHERE " + where
+        sql += " ORDER BY mac_address LIMIT ? OFFSET ?"
+        params = (*filters.values(), -1 if limit is None else limit, offset)
+        
+        try:
+            with self._db_lock:
+                rows = self._conn.execute(sql, params).fetchall()
+        except Exception as e:
+            logger.error(f"Error querying devices from database: {e}")
+            return []
+        
+        return [self.devices[mac] for mac, in rows if mac in self.devices]
+    
+    def set_device_status(self, mac_address: str, status: str) -> bool:
+        """设置设备状态，同时更新状态索引
+        
+        Args:
+            mac_address: MAC地址
+            status: 新状态，如 online, offline, isolated
+            
+        Returns:
+            设备是否存在
+        """
+        device = self.get_device(mac_address)
+        if not device:
+            return False
+        self._set_indexed_field(device, "status", status)
+        
+        # 由写入线程合并写入数据库
+        with self._pending_lock:
+            self._pending.add(mac_address)
+        return True
+    
+    def _index_device(self, device: Device) -> None:
+        """将设备加入二级索引
+        
+        Args:
+            device: 设备对象
+        """
+        for field, index in self._indexes.items():
+            index[getattr(device, field)].add(device.mac_address)
+        for group_id in device.groups:
+            self._group_index[group_id].add(device.mac_address)
+    
+    def _unindex_device(self, device: Device) -> None:
+        """将设备从二级索引中移除
+        
+        Args:
+            device: 设备对象
+        """
+        for field, index in self._indexes.items():
+            value = getattr(device, field)
+            macs = index.get(value)
+            if macs is not None:
+                macs.discard(device.mac_address)
+                if not macs:
+                    del index[value]
+        for group_id in device.groups:
+            self._discard_from_group_index(group_id, device.mac_address)
+    
+    def _discard_from_group_index(self, group_id: str, mac_address: str) -> None:
+        """将设备从分组索引中移除
+        
+        Args:
+            group_id: 分组ID
+            mac_address: MAC地址
+        """
+        macs = self._group_index.get(group_id)
+        if macs is not None:
+            macs.discard(mac_address)
+            if not macs:
+                del self._group_index[group_id]
+    
+    def _set_indexed_field(self, device: Device, field: str, value) -> None:
+        """修改设备的索引字段并同步索引
+        
+        Args:
+            device: 设备对象
+            field: 字段名，必须是 _INDEXED_FIELDS 之一
+            value: 新值
+        """
+        index = self._indexes[field]
+        old_value = getattr(device, field)
+        macs = index.get(old_value)
+        if macs is not None:
+            macs.discard(device.mac_address)
+            if not macs:
+                del index[old_value]
+        setattr(device, field, value)
+        index[value].add(device.mac_address)
+    
     def update_device_behavior(self, mac_address: str, behavior_data: Dict) -> None:
-        """更新设备行为数据
+        """更新设备行为数据，只修改内存，由写入线程定期合并写入数据库
         
         Args:
             mac_address: MAC地址
@@ -820,20 +1351,61 @@ class DeviceManager:
         """
         device = self.get_device(mac_address)
         if device:
-            # 更新流量统计
-            if "traffic" in behavior_data:
-                traffic = behavior_data["traffic"]
-                device.traffic_stats["bytes_in"] += traffic.get("bytes_in", 0)
-                device.traffic_stats["bytes_out"] += traffic.get("bytes_out", 0)
-                device.traffic_stats["packets_in"] += traffic.get("packets_in", 0)
-                device.traffic_stats["packets_out"] += traffic.get("packets_out", 0)
-            
-            # 更新行为基线
-            if "baseline" in behavior_data:
-                device.behavior_baseline.update(behavior_data["baseline"])
-            
-            # 保存到数据库
-            self._save_device_to_db(device)
+            with self._pending_lock:
+                # 更新流量统计
+                if "traffic" in behavior_data:
+                    traffic = behavior_data["traffic"]
+                    device.traffic_stats["bytes_in"] += traffic.get("bytes_in", 0)
+                    device.traffic_stats["bytes_out"] += traffic.get("bytes_out", 0)
+                    device.traffic_stats["packets_in"] += traffic.get("packets_in", 0)
+                    device.traffic_stats["packets_out"] += traffic.get("packets_out", 0)
+                
+                # 更新行为基线
+                if "baseline" in behavior_data:
+                    device.behavior_baseline.update(behavior_data["baseline"])
+                
+                # 登记待写入，同一设备在一个写入周期内只写一次
+                self._pending.add(mac_address)
+    
+    def flush(self) -> None:
+        """立即写入所有待保存的设备行为更新"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        
+        devices = [self.devices[mac] for mac in pending if mac in self.devices]
+        # 持久化字段无变化的设备会在批量保存时跳过
+        self._save_devices_bulk(devices)
+    
+    def snapshot(self) -> None:
+        """将内存数据库写回磁盘文件，未启用内存数据库时不做任何操作"""
+        if self._disk_conn is None:
+            return
+        
+        try:
+            # backup 在目标库的单个事务中完成，磁盘文件不会出现写了一半的状态
+            with self._db_lock:
+                self._conn.backup(self._disk_conn)
+        except Exception as e:
+            logger.error(f"Error writing device database snapshot: {e}")
+    
+    def stop(self) -> None:
+        """停止写入线程，写入剩余的更新并写回快照"""
+        self._flush_stop.set()
+        if self._flush_thread.is_alive():
+            self._flush_thread.join(timeout=5)
+        self.flush()
+        self.snapshot()
+    
+    def _flush_pending_loop(self) -> None:
+        """合并写入循环，启用内存数据库时同时按间隔写回快照"""
+        last_snapshot = time.monotonic()
+        while not self._flush_stop.wait(_FLUSH_INTERVAL_SECONDS):
+            if self._pending:
+                self.flush()
+            
+            if self._disk_conn is not None and time.monotonic() - last_snapshot >= self.db_snapshot_interval:
+                self.snapshot()
+                last_snapshot = time.monotonic()
     
     def add_device_to_group(self, mac_address: str, group_id: str) -> bool:
         """将设备添加到分组
@@ -848,6 +1420,7 @@ class DeviceManager:
         device = self.get_device(mac_address)
         if device and group_id not in device.groups:
             device.groups.append(group_id)
+            self._group_index[group_id].add(mac_address)
             self._save_device_to_db(device)
             return True
         return False
@@ -865,6 +1438,9 @@ class DeviceManager:
         device = self.get_device(mac_address)
         if device and group_id in device.groups:
             device.groups.remove(group_id)
+            # 设备可能因数据异常重复属于同一分组，全部移除后才从索引中删除
+            if group_id not in device.groups:
+                self._discard_from_group_index(group_id, mac_address)
             self._save_device_to_db(device)
             return True
         return False
@@ -878,8 +1454,4 @@ class DeviceManager:
         Returns:
             设备列表
         """
-        result = []
-        for device in self.devices.values():
-            if group_id in device.groups:
-                result.append(device)
-        return result
+        return [self.devices[mac] for mac in self._group_index.get(group_id, ()) if mac in self.devices]
@@ -123,6 +123,7 @@ class WarefireSystem:
         self.traffic_analyzer.stop()
         self.anomaly_detector.stop()
         self.signature_detector.stop()
+        self.device_manager.stop()
         
         logger.info("Warefire System stopped")
     
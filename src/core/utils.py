@@ -6,7 +6,14 @@ import os
 import time
 import json
 import hashlib
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Union
+
+# 尝试导入orjson库，用于更快的JSON序列化，不可用时回退到标准库json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # 全局日志对象
 logger = logging.getLogger("warefire")
@@ -82,6 +89,51 @@ def calculate_file_hash(file_path: str, algorithm: str = "sha256") -> str:
         logger.error(f"Error calculating file hash for {file_path}: {e}")
         return ""
 
+def json_dumps(data: Any, indent: bool = False) -> str:
+    """序列化为JSON字符串，非ASCII字符原样输出
+    
+    Args:
+        data: 要序列化的数据
+        indent: 是否以2个空格缩进
+        
+    Returns:
+        JSON字符串
+    """
+    if ORJSON_AVAILABLE:
+        return json_dumpb(data, indent).decode("utf-8")
+    if indent:
+        return json.dumps(data, indent=2, ensure_ascii=False)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def json_dumpb(data: Any, indent: bool = False) -> bytes:
+    """序列化为UTF-8编码的JSON字节串，适合直接写入二进制文件
+    
+    Args:
+        data: 要序列化的数据
+        indent: 是否以2个空格缩进
+        
+    Returns:
+        JSON字节串
+    """
+    if ORJSON_AVAILABLE:
+        # 与标准库一致，允许非字符串键（如整数端口号）
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option)
+    return json_dumps(data, indent).encode("utf-8")
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """解析JSON字符串
+    
+    Args:
+        data: JSON字符串或UTF-8字节串
+        
+    Returns:
+        解析后的数据
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
 def load_json_file(file_path: str) -> Dict[str, Any]:
     """加载JSON文件
     
@@ -92,8 +144,8 @@ def load_json_file(file_path: str) -> Dict[str, Any]:
         JSON数据字典
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(file_path, "rb") as f:
+            return json_loads(f.read())
     except Exception as e:
         logger.error(f"Error loading JSON file {file_path}: {e}")
         return {}
@@ -115,7 +167,7 @@ def save_json_file(data: Dict[str, Any], file_path: str) -> bool:
             os.makedirs(dir_path)
         
         with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.write(json_dumps(data, indent=True))
         return True
     except Exception as e:
         logger.error(f"Error saving JSON file {file_path}: {e}")
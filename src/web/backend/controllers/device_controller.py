@@ -93,7 +93,7 @@ def isolate_device(warefire_system, mac_address):
         
         # TODO: 实现设备隔离逻辑
         # 例如：将设备添加到隔离组，或通过防火墙规则隔离
-        device.status = "isolated"
+        warefire_system.device_manager.set_device_status(mac_address, "isolated")
         
         return jsonify({
             "success": True,
@@ -129,7 +129,7 @@ def release_device(warefire_system, mac_address):
         
         # TODO: 实现设备释放逻辑
         # 例如：将设备从隔离组移除，或删除防火墙隔离规则
-        device.status = "online"
+        warefire_system.device_manager.set_device_status(mac_address, "online")
         
         return jsonify({
             "success": True,
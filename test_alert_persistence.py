@@ -6,6 +6,7 @@
 """
 
 import os
+import tempfile
 import time
 from src.core.config import Config
 from src.core.alert_engine import AlertEngine
@@ -82,18 +83,125 @@ def test_alert_persistence():
         print("✓ 测试文件清理成功")
         
         return True
-        
+    
     except Exception as e:
         print(f"✗ 测试失败: {e}")
         import traceback
         traceback.print_exc()
         return False
 
+def _create_engine(db_path, max_in_memory=10000):
+    """创建使用指定数据库的告警引擎"""
+    config = Config()
+    config.set("alert_engine.alert_db_path", db_path)
+    config.set("alert_engine.max_alerts_per_hour", 100000)
+    config.set("alert_engine.max_alerts_in_memory", max_in_memory)
+    config.set("alert_engine.alert_levels", ["low", "medium", "high", "critical"])
+    return AlertEngine(config)
+
+def _create_alerts(alert_engine, count):
+    """按类型、严重程度和来源轮换创建告警，返回按创建先后排列的告警"""
+    alerts = []
+    for i in range(count):
+        alerts.append(alert_engine.create_alert(
+            alert_type=("scan", "malware", "anomaly")[i % 3],
+            severity=("low", "medium", "high", "critical")[i % 4],
+            source=("sensor_a", "sensor_b")[i % 2],
+            description=f"Test alert {i}",
+            details={"index": i}
+        ))
+    return alerts
+
+def test_get_alerts_filters():
+    """测试数据库过滤分页与内存过滤结果一致，以及不支持的过滤键"""
+    print("测试告警过滤和分页...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        alert_engine = _create_engine(os.path.join(temp_dir, "alerts.db"))
+        alerts = _create_alerts(alert_engine, 60)
+        for alert in alerts[::5]:
+            alert_engine.acknowledge_alert(alert.alert_id, "admin")
+        for alert in alerts[1::7]:
+            alert_engine.close_alert(alert.alert_id, "operator")
+        
+        cases = [
+            {},
+            {"severity": "high"},
+            {"alert_type": "scan", "source": "sensor_a"},
+            {"status": "acknowledged"},
+            {"status": "closed", "resolved_by": "operator"},
+            {"acknowledged_by": "admin", "alert_type": "malware"},
+            {"alert_id": alerts[7].alert_id},
+            {"severity": "info"},
+        ]
+        for filters in cases:
+            # 线性过滤全部告警，新的在前
+            expected = [alert.alert_id for alert in reversed(alerts)
+                        if all(getattr(alert, key) == value for key, value in filters.items())]
+            for limit, offset in ((100, 0), (7, 0), (7, 7), (5, 13), (10, len(expected))):
+                result = alert_engine.get_alerts(filters, limit=limit, offset=offset)
+                in_memory = alert_engine._filter_in_memory(filters, limit, offset)
+                assert [alert.alert_id for alert in result] == expected[offset:offset + limit], (filters, limit, offset)
+                assert [alert.alert_id for alert in in_memory] == expected[offset:offset + limit], (filters, limit, offset)
+                # 内存中的告警返回同一实例
+                assert all(alert is alert_engine.alerts[alert.alert_id] for alert in result)
+        print("✓ 数据库过滤分页结果与内存过滤一致")
+        
+        for filters in ({"description": "Test alert 1"}, {"status": "new", "1=1 OR status": "new"}):
+            try:
+                alert_engine.get_alerts(filters)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"未知过滤键未抛出ValueError: {filters}")
+        print("✓ 不支持的过滤键抛出ValueError")
+    
+    return True
+
+def test_evicted_alert_fallback():
+    """测试超出内存上限被淘汰的告警仍可从数据库获取和确认"""
+    print("测试已淘汰告警的数据库回退...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "alerts.db")
+        alert_engine = _create_engine(db_path, max_in_memory=5)
+        alerts = _create_alerts(alert_engine, 12)
+        
+        assert list(alert_engine.alerts) == [alert.alert_id for alert in alerts[-5:]]
+        assert alert_engine.get_alert_stats()["total_alerts"] == 5
+        evicted = alerts[0]
+        assert evicted.alert_id not in alert_engine.alerts
+        
+        loaded = alert_engine.get_alert(evicted.alert_id)
+        assert loaded is not None and loaded is not evicted
+        assert loaded.to_dict() == evicted.to_dict()
+        print("✓ 已淘汰的告警可从数据库获取")
+        
+        stats_before = alert_engine.get_alert_stats()
+        assert alert_engine.acknowledge_alert(evicted.alert_id, "admin")
+        assert not alert_engine.acknowledge_alert("alert_0_missing", "admin")
+        acknowledged = alert_engine.get_alert(evicted.alert_id)
+        assert acknowledged.status == "acknowledged" and acknowledged.acknowledged_by == "admin"
+        assert acknowledged.acknowledged_at > 0
+        assert evicted.alert_id not in alert_engine.alerts
+        # 统计只覆盖内存中的告警，确认已淘汰的告警不影响统计
+        assert alert_engine.get_alert_stats() == stats_before
+        assert [alert.alert_id for alert in alert_engine.get_alerts({"status": "acknowledged"})] == [evicted.alert_id]
+        print("✓ 已淘汰的告警可确认，状态写入数据库")
+        
+        # 重启后仍能查到确认状态
+        reloaded = _create_engine(db_path, max_in_memory=5)
+        assert reloaded.get_alert(evicted.alert_id).status == "acknowledged"
+        assert len(reloaded.alerts) == 5
+        print("✓ 重启后确认状态保持不变")
+    
+    return True
+
 if __name__ == "__main__":
     print("告警状态持久化测试")
     print("=" * 30)
     
-    if test_alert_persistence():
+    if test_alert_persistence() and test_get_alerts_filters() and test_evicted_alert_fallback():
         print("\n✓ 测试通过！告警状态持久化功能正常")
         exit(0)
     else:
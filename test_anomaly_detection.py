@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试异常行为检测：基线持久化、模型评分和评分缓存
+"""
+
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from src.core.config import Config
+from src.core import anomaly_detection
+from src.core.anomaly_detection import AnomalyDetector, BehaviorBaseline, _BloomFilter, _LFUCache
+from src.core.utils import save_json_file
+
+class MockDeviceManager:
+    """只提供设备表的设备管理器"""
+    
+    def __init__(self):
+        self.devices = {}
+    
+    def get_device(self, mac_address):
+        return self.devices.get(mac_address)
+
+def _random_mac():
+    return "02:%02x:%02x:%02x:%02x:%02x" % tuple(random.randrange(256) for _ in range(5))
+
+def _traffic(value):
+    return {"traffic": {"bytes_in": value, "bytes_out": value, "packets_in": 50, "packets_out": 50}}
+
+def _create_detector(db_path):
+    config = Config()
+    config.set("anomaly_detection.baseline_db_path", db_path)
+    return AnomalyDetector(config, MockDeviceManager())
+
+def test_baseline_round_trip():
+    """测试基线写入 baselines 表后重新加载的一致性"""
+    print("测试基线持久化...")
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(temp_dir, "baselines.db")
+        detector = _create_detector(db_path)
+        
+        mac = _random_mac()
+        for i in range(30):
+            behavior = _traffic(1000 + i * 10)
+            behavior["ports"] = {"used": [80, 443]}
+            behavior["protocols"] = {"tcp": 3}
+            behavior["domains"] = {"visited": ["example.com"]}
+            detector.detect_anomaly(mac, behavior)
+        detector.flush()
+        print("✓ 写入基线")
+        
+        reloaded = _create_detector(db_path)
+        assert mac in reloaded.baselines, "重新加载后基线不存在"
+        original, restored = detector.baselines[mac], reloaded.baselines[mac]
+        assert restored.samples == original.samples
+        assert restored.feature_names == original.feature_names
+        assert np.allclose(restored.mean, original.mean) and np.allclose(restored.var, original.var)
+        assert np.allclose(restored.history, original.history)
+        assert restored.features["port_usage"] == original.features["port_usage"]
+        assert restored.features["protocol_distribution"] == {"tcp": 90}
+        assert "example.com" in restored.domain_bloom
+        assert np.array_equal(restored.hourly_activity, original.hourly_activity)
+        print("✓ 重新加载的基线与原基线一致")
+        
+        # 旧版JSON基线文件在加载时导入数据库
+        legacy_mac = _random_mac()
+        legacy = BehaviorBaseline(legacy_mac)
+        legacy.update(_traffic(777))
+        legacy_path = os.path.join(reloaded.models_dir, legacy_mac.replace(":", "-") + ".baseline.json")
+        save_json_file(legacy.to_dict(), legacy_path)
+        try:
+            imported = _create_detector(db_path)
+            assert legacy_mac in imported.baselines and imported.baselines[legacy_mac].samples == 1
+        finally:
+            os.remove(legacy_path)
+        assert legacy_mac in _create_detector(db_path).baselines, "旧版基线未写入数据库"
+        print("✓ 旧版JSON基线已导入数据库")
+    finally:
+        shutil.rmtree(temp_dir)
+    
+    return True
+
+def test_model_scoring():
+    """测试异常样本分数高于检测阈值、正常样本低于阈值，以及模型重新拟合后缓存失效"""
+    print("测试模型评分...")
+    
+    if not anomaly_detection.SKLEARN_AVAILABLE:
+        print("✓ 未安装scikit-learn，跳过模型评分测试")
+        return True
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        detector = _create_detector(os.path.join(temp_dir, "baselines.db"))
+        threshold = detector.detection_threshold
+        
+        mac = _random_mac()
+        rng = np.random.default_rng(0)
+        for _ in range(40):
+            detector.detect_anomaly(mac, _traffic(int(rng.normal(5000, 300))))
+        
+        # 检测路径上只排队，不拟合模型
+        assert mac not in detector.gmms and mac in detector._pending_fits
+        detector._fit_pending_models()
+        assert mac in detector.gmms, "模型未拟合"
+        print("✓ 模型由更新线程的待拟合队列拟合")
+        
+        baseline = detector.baselines[mac]
+        normal = _traffic(5000)
+        outlier = _traffic(10 ** 8)
+        is_anomaly, score = detector._score(baseline, normal)
+        assert not is_anomaly and score < threshold, score
+        is_anomaly, score = detector._score(baseline, outlier)
+        assert is_anomaly and score > threshold, score
+        print(f"✓ 正常样本低于阈值、异常样本高于阈值 ({threshold})")
+        
+        # 相同行为第二次评分命中缓存
+        assert any(key[0] == mac for key in detector._score_cache._entries)
+        
+        # 行为整体变化后重新拟合，原来正常的样本变为异常，旧的缓存评分不能再被使用
+        for _ in range(200):
+            baseline.update(_traffic(int(rng.normal(500000, 20000))))
+        detector._fit_gmm(baseline)
+        assert not any(key[0] == mac for key in detector._score_cache._entries), "重新拟合后缓存未失效"
+        is_anomaly, score = detector._score(baseline, normal)
+        assert is_anomaly and score > threshold, score
+        print("✓ 重新拟合后缓存评分失效")
+    finally:
+        shutil.rmtree(temp_dir)
+    
+    return True
+
+def test_batch_update_and_helpers():
+    """测试批量更新与逐个更新一致，以及LFU缓存和布隆过滤器"""
+    print("测试批量更新和辅助结构...")
+    
+    baselines = [BehaviorBaseline(_random_mac()) for _ in range(4)]
+    expected = [BehaviorBaseline(b.device_mac) for b in baselines]
+    for step in range(5):
+        behaviors = [_traffic(100 * (i + 1) + 37 * step) for i in range(len(baselines))]
+        BehaviorBaseline.update_many(baselines, behaviors)
+        for baseline, behavior in zip(expected, behaviors):
+            baseline.update(behavior)
+    for batched, single in zip(baselines, expected):
+        assert batched.samples == single.samples == 5
+        assert np.allclose(batched.mean, single.mean) and np.allclose(batched.var, single.var)
+    print("✓ 批量更新与逐个更新结果一致")
+    
+    cache = _LFUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    cache.discard_if(lambda key: key == "a")
+    assert cache.get("a") is None and cache.get("c") == 3
+    print("✓ LFU缓存淘汰使用次数最少的条目")
+    
+    bloom = _BloomFilter()
+    names = ["d%d.example.com" % i for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+    assert all(name in bloom for name in names)
+    false_positives = sum(("x%d.other.org" % i) in bloom for i in range(10000))
+    assert false_positives < 300, false_positives
+    print(f"✓ 布隆过滤器无漏判，误判 {false_positives}/10000")
+    
+    return True
+
+if __name__ == "__main__":
+    print("异常行为检测测试")
+    print("=" * 30)
+    
+    if test_baseline_round_trip() and test_model_scoring() and test_batch_update_and_helpers():
+        print("\n✓ 测试通过！异常行为检测功能正常")
+        exit(0)
+    else:
+        print("\n✗ 测试失败！异常行为检测功能异常")
+        exit(1)
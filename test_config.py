@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试配置加载、验证、观察者通知和保存
+"""
+
+import json
+import os
+import tempfile
+
+from src.core.config import Config
+
+class BatchObserver:
+    """记录每次批量通知的观察者"""
+    
+    def __init__(self):
+        self.batches = []
+        self.single_calls = []
+    
+    def __call__(self, key, old_value, new_value):
+        self.single_calls.append((key, old_value, new_value))
+    
+    def notify_batch(self, changes):
+        self.batches.append(list(changes))
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+def test_observer_batches():
+    """测试每次合并配置文件时观察者只收到一批变更"""
+    print("测试观察者批量通知...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = Config()
+        batch_observer = BatchObserver()
+        plain_calls = []
+        config.add_observer(batch_observer)
+        config.add_observer(lambda key, old_value, new_value: plain_calls.append((key, old_value, new_value)))
+        
+        path = os.path.join(temp_dir, "config.json")
+        _write_json(path, {
+            "system": {"mode": "detection", "log_level": "INFO"},
+            "ui.theme": "light",
+            "device_manager": {"scan_interval_seconds": 600},
+        })
+        config._load_config(path)
+        
+        expected = [
+            ("system.mode", "learning", "detection"),
+            ("ui.theme", "dark", "light"),
+            ("device_manager.scan_interval_seconds", 300, 600),
+        ]
+        assert batch_observer.batches == [expected], batch_observer.batches
+        assert batch_observer.single_calls == []
+        assert plain_calls == expected, plain_calls
+        print("✓ 一次合并只产生一批通知，未变化的键不通知")
+        
+        # 第二次合并是新的一批
+        _write_json(path, {"system.mode": "learning", "ui": {"theme": "light"}})
+        config._load_config(path)
+        assert batch_observer.batches[1:] == [[("system.mode", "detection", "learning")]], batch_observer.batches
+        
+        # set 仍然逐条立即通知
+        config.set("ui.theme", "auto")
+        assert batch_observer.single_calls == [("ui.theme", "light", "auto")]
+        assert len(batch_observer.batches) == 2
+        print("✓ 每次合并各自一批，set 逐条通知")
+    
+    return True
+
+def test_invalid_values_reset():
+    """测试 set 无效值时重置为默认值"""
+    print("测试无效配置值重置...")
+    
+    config = Config()
+    invalid = [
+        ("system.mode", "bogus", "learning"),
+        ("system.log_level", "VERBOSE", "INFO"),
+        ("anomaly_detection.detection_threshold", 1.5, 0.95),
+        ("anomaly_detection.detection_threshold", "0.5", 0.95),
+        ("performance.threads.traffic_analyzer", 0, 1),
+        ("backup.schedule.frequency", "hourly", "daily"),
+        ("ui.theme", ["dark"], "dark"),
+    ]
+    for key, value, default in invalid:
+        config.set(key, value)
+        assert config.get(key) == default, (key, config.get(key))
+    
+    # 整段替换时逐个验证子项，合法子项保持不变
+    config.set("performance.threads", {"traffic_analyzer": 4, "alert_engine": -1})
+    assert config.get("performance.threads") == {"traffic_analyzer": 4, "alert_engine": 1}
+    
+    config.set("system.mode", "detection")
+    config.set("anomaly_detection.detection_threshold", 0.5)
+    assert config.get("system.mode") == "detection"
+    assert config.get("anomaly_detection.detection_threshold") == 0.5
+    assert config.validate_config()
+    print("✓ 无效值重置为默认值，合法值保持不变")
+    
+    return True
+
+def test_dotted_keys_match_nested():
+    """测试点分隔键配置文件与等价的嵌套配置文件加载结果相同"""
+    print("测试点分隔键配置文件...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        nested_path = os.path.join(temp_dir, "nested.json")
+        dotted_path = os.path.join(temp_dir, "dotted.json")
+        _write_json(nested_path, {
+            "system": {"mode": "detection", "log_level": "DEBUG"},
+            "backup": {"schedule": {"frequency": "weekly"}},
+            "performance": {"threads": {"traffic_analyzer": 8}},
+            "custom": {"section": {"enabled": True}},
+        })
+        _write_json(dotted_path, {
+            "system.mode": "detection",
+            "system": {"log_level": "DEBUG"},
+            "backup.schedule.frequency": "weekly",
+            "performance.threads.traffic_analyzer": 8,
+            "custom.section.enabled": True,
+        })
+        
+        nested, dotted = Config(nested_path), Config(dotted_path)
+        assert dotted.config == nested.config
+        assert dotted.snapshot() == nested.snapshot()
+        for key in ("system.mode", "system.log_level", "backup.schedule.frequency",
+                    "performance.threads", "custom.section", "custom.section.enabled"):
+            assert dotted.get(key) == nested.get(key), key
+        assert dotted.get("performance.threads.signature_detection") == 1
+        print("✓ 点分隔键与嵌套写法加载结果一致")
+    
+    return True
+
+def test_save_round_trip():
+    """测试保存后重新加载得到相同配置"""
+    print("测试配置保存和加载...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = Config()
+        config.set("system.mode", "detection")
+        config.set("device_manager.scan_interval_seconds", 600)
+        config.set("notification.channels", ["web", "mobile"])
+        config.set("custom.nested.value", {"a": 1, "b": [1.5, None, "x"]})
+        
+        for pretty in (True, False):
+            path = os.path.join(temp_dir, f"saved_{pretty}.json")
+            config.save(path, pretty=pretty)
+            assert not os.path.exists(path + ".tmp")
+            
+            reloaded = Config(path)
+            assert reloaded.config == config.config
+            assert reloaded.get("custom.nested.value.b") == [1.5, None, "x"]
+            assert reloaded.get("system.mode") == "detection"
+        print("✓ 保存后重新加载的配置一致")
+    
+    return True
+
+if __name__ == "__main__":
+    print("配置管理测试")
+    print("=" * 30)
+    
+    if (test_observer_batches() and test_invalid_values_reset()
+            and test_dotted_keys_match_nested() and test_save_round_trip()):
+        print("\n✓ 测试通过！配置管理功能正常")
+        exit(0)
+    else:
+        print("\n✗ 测试失败！配置管理功能异常")
+        exit(1)
@@ -5,7 +5,13 @@
 测试设备识别优化
 """
 
-from src.core.device_manager import Device, DeviceManager
+import ctypes
+import os
+import socket
+import struct
+import tempfile
+
+from src.core.device_manager import Device, DeviceManager, _MibIpNetRow
 from src.core.config import Config
 
 def test_device_identification():
@@ -80,20 +86,172 @@ def test_device_identification():
             print("\n✓ 所有设备识别测试通过！")
         else:
             print("\n✗ 设备识别测试失败！")
-            
-        return success
         
+        return success
+    
     except Exception as e:
         print(f"\n✗ 测试失败: {e}")
         import traceback
         traceback.print_exc()
         return False
 
+def _create_device_manager(temp_dir):
+    """创建使用临时数据库的设备管理器"""
+    config = Config()
+    config.set("device_manager.device_db_path", os.path.join(temp_dir, "devices.db"))
+    return DeviceManager(config)
+
+def _pairs(devices):
+    return [(device.ip_address, device.mac_address) for device in devices]
+
+def test_arp_parsing():
+    """测试arp命令输出、/proc/net/arp 和 GetIpNetTable 缓冲区的解析"""
+    print("测试ARP表解析...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        device_manager = _create_device_manager(temp_dir)
+        device_manager.stop()
+        
+        # Windows arp -a 输出：接口行、表头、格式错误的MAC、广播和多播地址、全零和广播MAC、重复MAC
+        arp_output = (
+            b"\r\n"
+            b"Interface: 192.168.77.2 --- 0xb\r\n"
+            b"  Internet Address      Physical Address      Type\r\n"
+            b"  192.168.77.1          aa-bb-cc-00-00-01     dynamic\r\n"
+            b"  192.168.77.3          AA-BB-CC-00-00-03     dynamic\r\n"
+            b"  192.168.77.4          aa-bb-cc-00-00        dynamic\r\n"
+            b"  192.168.77.5          aa-bb-cc-00-00-0g     dynamic\r\n"
+            b"  192.168.77.6          aa:bb-cc:00:00:06     dynamic\r\n"
+            b"  192.168.77.255        ff-ff-ff-ff-ff-ff     static\r\n"
+            b"  192.168.77.254        aa-bb-cc-00-00-fe     static\r\n"
+            b"  192.168.77.0          aa-bb-cc-00-00-10     static\r\n"
+            b"  224.0.0.22            01-00-5e-00-00-16     static\r\n"
+            b"  999.1.1.1             aa-bb-cc-00-00-07     dynamic\r\n"
+            b"  192.168.77.8          aa-bb-cc-00-00-01     dynamic\r\n"
+            b"  192.168.77.9          00-00-00-00-00-00     invalid\r\n"
+        )
+        assert list(DeviceManager._iter_arp_output(arp_output)) == [
+            ("192.168.77.1", "aa-bb-cc-00-00-01"),
+            ("192.168.77.3", "AA-BB-CC-00-00-03"),
+            ("192.168.77.255", "ff-ff-ff-ff-ff-ff"),
+            ("192.168.77.254", "aa-bb-cc-00-00-fe"),
+            ("192.168.77.0", "aa-bb-cc-00-00-10"),
+            ("224.0.0.22", "01-00-5e-00-00-16"),
+            ("999.1.1.1", "aa-bb-cc-00-00-07"),
+            ("192.168.77.8", "aa-bb-cc-00-00-01"),
+            ("192.168.77.9", "00-00-00-00-00-00"),
+        ]
+        assert _pairs(device_manager._parse_arp_output(arp_output)) == [
+            ("192.168.77.1", "aa:bb:cc:00:00:01"),
+            ("192.168.77.3", "aa:bb:cc:00:00:03"),
+            ("192.168.77.254", "aa:bb:cc:00:00:fe"),
+        ]
+        print("✓ arp命令输出解析正确")
+        
+        # /proc/net/arp：未完成解析的表项MAC为全零
+        proc_path = os.path.join(temp_dir, "arp")
+        with open(proc_path, "w") as f:
+            f.write(
+                "IP address       HW type     Flags       HW address            Mask     Device\n"
+                "192.168.77.1     0x1         0x2         aa:bb:cc:00:00:01     *        eth0\n"
+                "192.168.77.20    0x1         0x0         00:00:00:00:00:00     *        eth0\n"
+                "10.20.0.7        0x1         0x2         de:ad:be:ef:00:07     *        wlan0\n"
+                "192.168.77.255   0x1         0x6         ff:ff:ff:ff:ff:ff     *        eth0\n"
+            )
+        assert list(DeviceManager._read_proc_net_arp(proc_path)) == [
+            ("192.168.77.1", "aa:bb:cc:00:00:01"),
+            ("192.168.77.20", "00:00:00:00:00:00"),
+            ("10.20.0.7", "de:ad:be:ef:00:07"),
+            ("192.168.77.255", "ff:ff:ff:ff:ff:ff"),
+        ]
+        assert _pairs(device_manager._build_devices(DeviceManager._read_proc_net_arp(proc_path))) == [
+            ("192.168.77.1", "aa:bb:cc:00:00:01"),
+            ("10.20.0.7", "de:ad:be:ef:00:07"),
+        ]
+        print("✓ /proc/net/arp 解析正确")
+        
+        # GetIpNetTable 返回的 MIB_IPNETTABLE：表项数量后紧跟 MIB_IPNETROW 数组，dwType 2 为无效表项
+        entries = [
+            ("192.168.77.1", b"\xaa\xbb\xcc\x00\x00\x01", 6, 3),
+            ("192.168.77.30", b"\xaa\xbb\xcc\x00\x00\x1e", 6, 2),
+            ("192.168.77.31", b"\xaa\xbb\xcc\x00\x00\x1f", 0, 3),
+            ("10.20.0.8", b"\x00\x11\x22\x33\x44\x55", 6, 4),
+        ]
+        rows = (_MibIpNetRow * len(entries))()
+        for row, (ip_address, mac_address, length, row_type) in zip(rows, entries):
+            row.dwIndex = 11
+            row.dwPhysAddrLen = length
+            row.bPhysAddr[:6] = list(mac_address)
+            row.dwAddr = struct.unpack("=I", socket.inet_aton(ip_address))[0]
+            row.dwType = row_type
+        buffer = ctypes.create_string_buffer(struct.pack("=I", len(entries)) + bytes(rows))
+        assert list(DeviceManager._parse_ip_net_table(buffer)) == [
+            ("192.168.77.1", "aa:bb:cc:00:00:01"),
+            ("10.20.0.8", "00:11:22:33:44:55"),
+        ]
+        print("✓ GetIpNetTable 缓冲区解析正确")
+    
+    return True
+
+def test_nmap_xml_parsing():
+    """测试多主机 nmap -oX 输出的解析，包括缺少 os 或 hostnames 元素的主机"""
+    print("测试nmap XML解析...")
+    
+    nmap_output = b"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE nmaprun>
+<nmaprun scanner="nmap" args="nmap -O -oX - 192.168.77.1 192.168.77.3 192.168.77.4" version="7.94">
+<host starttime="1700000000" endtime="1700000005"><status state="up" reason="arp-response"/>
+<address addr="192.168.77.1" addrtype="ipv4"/>
+<address addr="AA:BB:CC:00:00:01" addrtype="mac" vendor="TP-Link"/>
+<hostnames><hostname name="router.lan" type="PTR"/></hostnames>
+<ports><port protocol="tcp" portid="80"><state state="open"/><service name="http"/></port></ports>
+<os><portused state="open" proto="tcp" portid="80"/>
+<osmatch name="Linux 3.2 - 4.9" accuracy="98" line="61000">
+<osclass type="WAP" vendor="Linux" osfamily="Linux" osgen="3.X" accuracy="98"/>
+<osclass type="general purpose" vendor="Linux" osfamily="Linux" osgen="4.X" accuracy="98"/>
+</osmatch>
+<osmatch name="OpenWrt 19.07" accuracy="90" line="62000"/>
+</os>
+</host>
+<host starttime="1700000000" endtime="1700000005"><status state="up" reason="arp-response"/>
+<address addr="192.168.77.3" addrtype="ipv4"/>
+<address addr="AA:BB:CC:00:00:03" addrtype="mac"/>
+<hostnames><hostname name="printer.lan" type="PTR"/></hostnames>
+</host>
+<host starttime="1700000000" endtime="1700000005"><status state="up" reason="arp-response"/>
+<address addr="192.168.77.4" addrtype="ipv4"/>
+<os><osmatch name="Microsoft Windows 10" accuracy="95" line="70000">
+<osclass type="general purpose" vendor="Microsoft" osfamily="Windows" osgen="10" accuracy="95"/>
+</osmatch></os>
+</host>
+<host><status state="up" reason="nd-response"/>
+<address addr="fe80::1" addrtype="ipv6"/>
+<hostnames><hostname name="v6only.lan" type="PTR"/></hostnames>
+</host>
+<runstats><finished time="1700000005" exit="success"/><hosts up="4" down="0" total="4"/></runstats>
+</nmaprun>
+"""
+    assert DeviceManager._parse_nmap_xml(nmap_output) == {
+        "192.168.77.1": {"os": "Linux 3.2 - 4.9", "device_type": "WAP", "hostname": "router.lan"},
+        "192.168.77.3": {"hostname": "printer.lan"},
+        "192.168.77.4": {"os": "Microsoft Windows 10", "device_type": "general purpose"},
+    }
+    print("✓ 多主机nmap XML解析正确")
+    
+    # 空结果写入设备时不能覆盖已有字段
+    device = Device(mac_address="aa:bb:cc:00:00:03", ip_address="192.168.77.3")
+    device.os = "Linux"
+    DeviceManager._apply_nmap_info(device, DeviceManager._parse_nmap_xml(nmap_output)["192.168.77.3"])
+    assert device.os == "Linux" and device.hostname == "printer.lan"
+    print("✓ 缺少os元素时保留已有操作系统信息")
+    
+    return True
+
 if __name__ == "__main__":
     print("设备识别优化测试")
     print("=" * 30)
     
-    if test_device_identification():
+    if test_device_identification() and test_arp_parsing() and test_nmap_xml_parsing():
         print("\n✓ 测试通过！设备识别优化成功")
         exit(0)
     else:
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试设备管理器的二级索引、分组索引与数据库查询在设备状态变化后保持一致
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+from src.core.config import Config
+from src.core.device_manager import Device, DeviceManager
+
+STATUSES = ("online", "offline", "isolated")
+GROUPS = ("all", "computer", "mobile", "iot", "camera", "guest")
+
+def _discovered(entries):
+    """按 (MAC地址, IP地址, 设备类型) 构造一次扫描结果"""
+    devices = []
+    for mac_address, ip_address, device_type in entries:
+        device = Device(mac_address, ip_address)
+        device.device_type = device_type
+        devices.append(device)
+    return devices
+
+def _macs(devices):
+    return sorted(device.mac_address for device in devices)
+
+def _check_consistency(device_manager, step):
+    """逐个状态和分组比较索引查询、数据库查询与线性过滤的结果"""
+    devices = list(device_manager.devices.values())
+    for status in STATUSES:
+        expected = _macs(device for device in devices if device.status == status)
+        assert _macs(device_manager.get_devices({"status": status})) == expected, (step, status)
+        assert [device.mac_address for device in device_manager.get_devices_sql({"status": status})] == expected, (step, status)
+        for device_type in ("computer", "iot"):
+            filters = {"status": status, "device_type": device_type}
+            expected = _macs(device for device in devices
+                             if device.status == status and device.device_type == device_type)
+            assert _macs(device_manager.get_devices(filters)) == expected, (step, filters)
+            assert [device.mac_address for device in device_manager.get_devices_sql(filters)] == expected, (step, filters)
+    for group_id in GROUPS:
+        expected = _macs(device for device in devices if group_id in device.groups)
+        assert _macs(device_manager.get_devices_by_group(group_id)) == expected, (step, group_id)
+    print(f"✓ {step}：索引、分组和数据库查询与线性过滤一致")
+
+def test_device_index_consistency():
+    """测试扫描、离线和手动设置状态后各查询方式结果一致"""
+    print("测试设备索引一致性...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = Config()
+        config.set("device_manager.device_db_path", os.path.join(temp_dir, "devices.db"))
+        device_manager = DeviceManager(config)
+        try:
+            first_scan = [
+                ("02:00:00:00:00:01", "192.168.77.11", "computer"),
+                ("02:00:00:00:00:02", "192.168.77.12", "iot"),
+                ("02:00:00:00:00:03", "192.168.77.13", "iot"),
+                ("02:00:00:00:00:04", "192.168.77.14", "unknown"),
+            ]
+            device_manager._update_device_status(_discovered(first_scan))
+            assert len(device_manager.devices) == 4
+            _check_consistency(device_manager, "扫描发现设备")
+            
+            # 第二次扫描少了一台设备，并且有一台设备更换了IP
+            second_scan = [entry for entry in first_scan if entry[0] != "02:00:00:00:00:02"]
+            second_scan[0] = ("02:00:00:00:00:01", "192.168.77.21", "computer")
+            device_manager._update_device_status(_discovered(second_scan))
+            assert device_manager.get_device("02:00:00:00:00:02").status == "offline"
+            assert device_manager.get_device("02:00:00:00:00:01").ip_address == "192.168.77.21"
+            _check_consistency(device_manager, "设备离线")
+            
+            assert device_manager.set_device_status("02:00:00:00:00:03", "isolated")
+            assert device_manager.set_device_status("02:00:00:00:00:02", "online")
+            assert not device_manager.set_device_status("02:00:00:00:00:ff", "isolated")
+            _check_consistency(device_manager, "手动设置状态")
+            
+            # 离线设备重新上线
+            device_manager._update_device_status(_discovered(first_scan))
+            _check_consistency(device_manager, "设备重新上线")
+        finally:
+            device_manager.stop()
+        
+        # 重新加载后索引与数据库一致
+        reloaded = DeviceManager(config)
+        try:
+            assert {mac: device.status for mac, device in reloaded.devices.items()} == \
+                {mac: device.status for mac, device in device_manager.devices.items()}
+            _check_consistency(reloaded, "重新加载")
+        finally:
+            reloaded.stop()
+    
+    return True
+
+def test_concurrent_flush():
+    """测试写入线程与扫描同时保存设备后，数据库中的行与内存中的设备一致"""
+    print("测试并发写入...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = Config()
+        db_path = os.path.join(temp_dir, "devices.db")
+        config.set("device_manager.device_db_path", db_path)
+        config.set("device_manager.unknown_device_alert", False)
+        device_manager = DeviceManager(config)
+        
+        entries = [("02:00:00:00:%02x:%02x" % divmod(i, 256), "10.20.%d.%d" % divmod(i + 1, 250), "iot")
+                   for i in range(300)]
+        macs = [entry[0] for entry in entries]
+        stop = threading.Event()
+        
+        def flush_loop():
+            # 行为更新登记待写入，随后由本线程立即写入，与扫描线程的保存交错进行
+            i = 0
+            while not stop.is_set():
+                for mac_address in macs[i % 7::7]:
+                    device_manager.update_device_behavior(mac_address, {"baseline": {"round": i}})
+                device_manager.flush()
+                i += 1
+        
+        flusher = threading.Thread(target=flush_loop)
+        try:
+            device_manager._update_device_status(_discovered(entries))
+            flusher.start()
+            # 交替扫描到全部设备和一半设备，设备反复上线、离线
+            for round_number in range(60):
+                scan = entries if round_number % 2 else entries[round_number % 3::2]
+                device_manager._update_device_status(_discovered(scan))
+        finally:
+            stop.set()
+            if flusher.is_alive():
+                flusher.join()
+            device_manager.stop()
+        
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = {row[0]: row for row in conn.execute("SELECT * FROM devices")}
+        finally:
+            conn.close()
+        assert rows.keys() == device_manager.devices.keys()
+        mismatched = [mac for mac, device in device_manager.devices.items()
+                      if tuple(rows[mac][:13]) != DeviceManager._device_to_row(device)]
+        assert not mismatched, f"{len(mismatched)} 个设备的数据库行与内存不一致，如 {mismatched[:3]}"
+        print("✓ 并发写入后数据库与内存中的设备一致")
+    
+    return True
+
+if __name__ == "__main__":
+    print("设备索引一致性测试")
+    print("=" * 30)
+    
+    if test_device_index_consistency() and test_concurrent_flush():
+        print("\n✓ 测试通过！设备索引保持一致")
+        exit(0)
+    else:
+        print("\n✗ 测试失败！设备索引不一致")
+        exit(1)
@@ -5,8 +5,6 @@
 测试MAC地址文件名处理
 """
 
-import os
-import json
 from src.core.config import Config
 from src.core.anomaly_detection import AnomalyDetector, BehaviorBaseline
 
@@ -37,24 +35,21 @@ def test_mac_filename_fix():
         anomaly_detector.save_baseline(baseline)
         print(f"✓ 基线保存成功")
         
-        # 检查文件是否存在，使用安全的文件名格式
-        safe_mac = test_mac.replace(':', '-')
-        expected_file = os.path.join(anomaly_detector.models_dir, f"{safe_mac}.baseline.json")
+        # 重新加载基线，检查是否以原始MAC地址持久化
+        reloaded = AnomalyDetector(config, device_manager)
         
-        if os.path.exists(expected_file):
-            print(f"✓ 基线文件已创建: {expected_file}")
+        if test_mac in reloaded.baselines:
+            print(f"✓ 基线已写入数据库: {reloaded.db_path}")
             
-            # 验证文件内容
-            with open(expected_file, 'r') as f:
-                content = json.load(f)
-                if content.get('device_mac') == test_mac:
-                    print(f"✓ 文件内容正确，包含原始MAC地址")
-                    return True
-                else:
-                    print(f"✗ 文件内容错误，MAC地址不匹配")
-                    return False
+            # 验证基线内容
+            if reloaded.baselines[test_mac].to_dict().get('device_mac') == test_mac:
+                print(f"✓ 基线内容正确，包含原始MAC地址")
+                return True
+            else:
+                print(f"✗ 基线内容错误，MAC地址不匹配")
+                return False
         else:
-            print(f"✗ 基线文件未创建: {expected_file}")
+            print(f"✗ 基线未写入数据库: {reloaded.db_path}")
             return False
             
     except Exception as e: